@@ -0,0 +1,8 @@
+--
+-- payment is partitioned by payment_date and has no primary key, so bulk
+-- upserts (POST /api/v1/payments/bulk) need a unique index to use as their
+-- ON CONFLICT target. Unique indexes on a partitioned table must include
+-- the partition key.
+--
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_unq_payment_payment_id_payment_date ON payment USING btree (payment_id, payment_date);
@@ -0,0 +1,50 @@
+--
+-- Materialized copies of the sales_by_film_category and sales_by_store views
+-- for the reporting endpoints (GET /api/v1/views/sales-by-*). The views join
+-- the whole payment history on every read; these are refreshed in the
+-- background with REFRESH MATERIALIZED VIEW CONCURRENTLY, which needs a
+-- unique index on each, and report_refresh records when each was refreshed.
+--
+
+CREATE TABLE IF NOT EXISTS report_refresh (
+    view_name text PRIMARY KEY,
+    refreshed_at timestamp with time zone DEFAULT now() NOT NULL
+);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_sales_by_film_category AS
+ SELECT c.name AS category,
+    sum(p.amount) AS total_sales
+   FROM (((((payment p
+     JOIN rental r ON ((p.rental_id = r.rental_id)))
+     JOIN inventory i ON ((r.inventory_id = i.inventory_id)))
+     JOIN film f ON ((i.film_id = f.film_id)))
+     JOIN film_category fc ON ((f.film_id = fc.film_id)))
+     JOIN category c ON ((fc.category_id = c.category_id)))
+  GROUP BY c.name;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_unq_mv_sales_by_film_category_category ON mv_sales_by_film_category USING btree (category);
+
+-- Same as sales_by_store plus store_id, the unique key a concurrent refresh
+-- needs and the tiebreaker of the report's keyset (store names may repeat)
+CREATE OR REPLACE VIEW sales_by_store_keyed AS
+ SELECT s.store_id,
+    (((c.city)::text || ','::text) || (cy.country)::text) AS store,
+    (((m.first_name)::text || ' '::text) || (m.last_name)::text) AS manager,
+    sum(p.amount) AS total_sales
+   FROM (((((((payment p
+     JOIN rental r ON ((p.rental_id = r.rental_id)))
+     JOIN inventory i ON ((r.inventory_id = i.inventory_id)))
+     JOIN store s ON ((i.store_id = s.store_id)))
+     JOIN address a ON ((s.address_id = a.address_id)))
+     JOIN city c ON ((a.city_id = c.city_id)))
+     JOIN country cy ON ((c.country_id = cy.country_id)))
+     JOIN staff m ON ((s.manager_staff_id = m.staff_id)))
+  GROUP BY cy.country, c.city, s.store_id, m.first_name, m.last_name;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_sales_by_store AS
+ SELECT store_id, store, manager, total_sales FROM sales_by_store_keyed;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_unq_mv_sales_by_store_store_id ON mv_sales_by_store USING btree (store_id);
+
+INSERT INTO report_refresh (view_name) VALUES ('mv_sales_by_film_category'), ('mv_sales_by_store')
+ON CONFLICT (view_name) DO NOTHING;
@@ -0,0 +1,169 @@
+--
+-- Denormalized film catalog: one row per film with its category, language,
+-- price and actors, served by /api/v1/catalog/*. It replaces the film_list
+-- and nicer_but_slower_film_list views, which run group_concat over
+-- film_actor and actor for every film on every read.
+--
+-- Statement-level triggers on film, film_actor and film_category (and on
+-- renames in actor, category and language) rebuild the affected films' rows
+-- in the same transaction, so the catalog never lags behind its sources.
+--
+
+CREATE TABLE IF NOT EXISTS film_catalog (
+    film_id integer PRIMARY KEY,
+    title text NOT NULL,
+    description text,
+    category text,
+    language text,
+    price numeric(4,2) NOT NULL,
+    length smallint,
+    rating mpaa_rating,
+    -- "FIRST LAST" as in film_list, and "FirstLast" as in nicer_but_slower_film_list
+    actors text[] NOT NULL,
+    nicer_actors text[] NOT NULL,
+    last_update timestamp with time zone DEFAULT now() NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION film_catalog_refresh(p_film_ids integer[]) RETURNS void
+    LANGUAGE sql
+    AS $_$
+DELETE FROM film_catalog c
+ WHERE c.film_id = ANY ($1)
+   AND NOT EXISTS (SELECT 1 FROM film f WHERE f.film_id = c.film_id);
+
+-- An upsert rather than delete-and-insert: two transactions refreshing the
+-- same new film then wait on each other instead of one hitting a unique violation
+INSERT INTO film_catalog (film_id, title, description, category, language, price, length, rating, actors, nicer_actors)
+SELECT f.film_id,
+    f.title,
+    f.description,
+    (SELECT string_agg(c.name, ', ' ORDER BY c.name)
+       FROM film_category fc JOIN category c ON c.category_id = fc.category_id
+      WHERE fc.film_id = f.film_id),
+    trim(l.name),
+    f.rental_rate,
+    f.length,
+    f.rating,
+    coalesce(fa.actors, '{}'),
+    coalesce(fa.nicer_actors, '{}')
+  FROM film f
+  JOIN language l ON l.language_id = f.language_id
+  LEFT JOIN LATERAL (
+    SELECT array_agg(a.first_name || ' ' || a.last_name ORDER BY a.last_name, a.first_name) AS actors,
+           array_agg(upper(substring(a.first_name, 1, 1)) || lower(substring(a.first_name, 2))
+                     || upper(substring(a.last_name, 1, 1)) || lower(substring(a.last_name, 2))
+                     ORDER BY a.last_name, a.first_name) AS nicer_actors
+      FROM film_actor x JOIN actor a ON a.actor_id = x.actor_id
+     WHERE x.film_id = f.film_id
+  ) fa ON true
+ WHERE f.film_id = ANY ($1)
+ON CONFLICT (film_id) DO UPDATE
+   SET title = EXCLUDED.title,
+       description = EXCLUDED.description,
+       category = EXCLUDED.category,
+       language = EXCLUDED.language,
+       price = EXCLUDED.price,
+       length = EXCLUDED.length,
+       rating = EXCLUDED.rating,
+       actors = EXCLUDED.actors,
+       nicer_actors = EXCLUDED.nicer_actors,
+       last_update = now();
+$_$;
+
+-- The triggers are statement-level: each sees the rows its statement
+-- changed as transition tables and rebuilds every affected film once, so a
+-- bulk insert of film_actor rows costs one refresh instead of one per row.
+-- Postgres allows transition tables only on single-event triggers without
+-- column lists, hence a trigger per event and the name comparisons below.
+-- Statements changing no relevant row rebuild nothing.
+
+CREATE OR REPLACE FUNCTION film_catalog_film_changed() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM film_catalog_refresh(array_agg(DISTINCT film_id)) FROM new_rows HAVING count(*) > 0;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM film_catalog_refresh(array_agg(DISTINCT film_id)) FROM old_rows HAVING count(*) > 0;
+    ELSE
+        PERFORM film_catalog_refresh(array_agg(film_id))
+           FROM (SELECT film_id FROM old_rows UNION SELECT film_id FROM new_rows) changed
+         HAVING count(*) > 0;
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION film_catalog_actor_changed() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    PERFORM film_catalog_refresh(array_agg(DISTINCT x.film_id))
+       FROM new_rows n
+       JOIN old_rows o ON o.actor_id = n.actor_id
+       JOIN film_actor x ON x.actor_id = n.actor_id
+      WHERE (n.first_name, n.last_name) IS DISTINCT FROM (o.first_name, o.last_name)
+     HAVING count(*) > 0;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION film_catalog_category_changed() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    PERFORM film_catalog_refresh(array_agg(DISTINCT fc.film_id))
+       FROM new_rows n
+       JOIN old_rows o ON o.category_id = n.category_id
+       JOIN film_category fc ON fc.category_id = n.category_id
+      WHERE n.name IS DISTINCT FROM o.name
+     HAVING count(*) > 0;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION film_catalog_language_changed() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    PERFORM film_catalog_refresh(array_agg(f.film_id))
+       FROM new_rows n
+       JOIN old_rows o ON o.language_id = n.language_id
+       JOIN film f ON f.language_id = n.language_id
+      WHERE n.name IS DISTINCT FROM o.name
+     HAVING count(*) > 0;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS film_catalog_film_insert_trigger ON film;
+CREATE TRIGGER film_catalog_film_insert_trigger AFTER INSERT ON film REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE film_catalog_film_changed();
+DROP TRIGGER IF EXISTS film_catalog_film_update_trigger ON film;
+CREATE TRIGGER film_catalog_film_update_trigger AFTER UPDATE ON film REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE film_catalog_film_changed();
+DROP TRIGGER IF EXISTS film_catalog_film_delete_trigger ON film;
+CREATE TRIGGER film_catalog_film_delete_trigger AFTER DELETE ON film REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE PROCEDURE film_catalog_film_changed();
+
+DROP TRIGGER IF EXISTS film_catalog_film_actor_insert_trigger ON film_actor;
+CREATE TRIGGER film_catalog_film_actor_insert_trigger AFTER INSERT ON film_actor REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE film_catalog_film_changed();
+DROP TRIGGER IF EXISTS film_catalog_film_actor_update_trigger ON film_actor;
+CREATE TRIGGER film_catalog_film_actor_update_trigger AFTER UPDATE ON film_actor REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE film_catalog_film_changed();
+DROP TRIGGER IF EXISTS film_catalog_film_actor_delete_trigger ON film_actor;
+CREATE TRIGGER film_catalog_film_actor_delete_trigger AFTER DELETE ON film_actor REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE PROCEDURE film_catalog_film_changed();
+
+DROP TRIGGER IF EXISTS film_catalog_film_category_insert_trigger ON film_category;
+CREATE TRIGGER film_catalog_film_category_insert_trigger AFTER INSERT ON film_category REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE film_catalog_film_changed();
+DROP TRIGGER IF EXISTS film_catalog_film_category_update_trigger ON film_category;
+CREATE TRIGGER film_catalog_film_category_update_trigger AFTER UPDATE ON film_category REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE film_catalog_film_changed();
+DROP TRIGGER IF EXISTS film_catalog_film_category_delete_trigger ON film_category;
+CREATE TRIGGER film_catalog_film_category_delete_trigger AFTER DELETE ON film_category REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE PROCEDURE film_catalog_film_changed();
+
+DROP TRIGGER IF EXISTS film_catalog_actor_trigger ON actor;
+CREATE TRIGGER film_catalog_actor_trigger AFTER UPDATE ON actor REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE film_catalog_actor_changed();
+
+DROP TRIGGER IF EXISTS film_catalog_category_trigger ON category;
+CREATE TRIGGER film_catalog_category_trigger AFTER UPDATE ON category REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE film_catalog_category_changed();
+
+DROP TRIGGER IF EXISTS film_catalog_language_trigger ON language;
+CREATE TRIGGER film_catalog_language_trigger AFTER UPDATE ON language REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE film_catalog_language_changed();
+
+SELECT film_catalog_refresh(array_agg(film_id)) FROM film;
@@ -0,0 +1,39 @@
+--
+-- get_customer_balance() as shipped is a straight port of the MySQL version
+-- and fails on PostgreSQL: it calls IF(), which doesn't exist, and stores
+-- an interval in an INTEGER. Its DECIMAL(5,2) totals also overflow for any
+-- customer past $999.99. This keeps the same rules and signature:
+--
+--   rental fees for every rental up to the effective date
+-- + $1 for every day a returned rental was kept past its rental_duration
+-- - payments made up to the effective date
+--
+-- GET /api/v1/customers/balances computes the same balance for many
+-- customers in one set-based query (src/utils/balances.py).
+--
+
+CREATE OR REPLACE FUNCTION get_customer_balance(p_customer_id integer, p_effective_date timestamp with time zone) RETURNS numeric
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    v_rentfees NUMERIC; -- FEES PAID TO RENT THE VIDEOS INITIALLY
+    v_overfees INTEGER; -- LATE FEES FOR PRIOR RENTALS
+    v_payments NUMERIC; -- SUM OF PAYMENTS MADE PREVIOUSLY
+BEGIN
+    SELECT COALESCE(SUM(film.rental_rate), 0),
+           COALESCE(SUM(GREATEST((rental.return_date::date - rental.rental_date::date) - film.rental_duration, 0)), 0)
+      INTO v_rentfees, v_overfees
+    FROM film, inventory, rental
+    WHERE film.film_id = inventory.film_id
+      AND inventory.inventory_id = rental.inventory_id
+      AND rental.rental_date <= p_effective_date
+      AND rental.customer_id = p_customer_id;
+
+    SELECT COALESCE(SUM(payment.amount), 0) INTO v_payments
+    FROM payment
+    WHERE payment.payment_date <= p_effective_date
+    AND payment.customer_id = p_customer_id;
+
+    RETURN v_rentfees + v_overfees - v_payments;
+END
+$$;
@@ -0,0 +1,18 @@
+--
+-- The payment endpoints list the newest payments first, ordered by
+-- (payment_date, payment_id), but no partition has an index in that order:
+-- "latest N" read and sorted every row of every partition.
+--
+-- With these indexes each partition yields its rows already in order, so
+-- the planner merges the partitions instead of sorting them and stops after
+-- N rows. As the partitions are disjoint payment_date ranges this is an
+-- ordered Append reading the newest partition first; orders that don't
+-- follow the partition key get a Merge Append (a k-way merge) instead.
+-- Together with the from/to bounds on the payment endpoints, partitions
+-- outside the range are pruned before any of this.
+--
+
+CREATE INDEX IF NOT EXISTS idx_payment_payment_date_payment_id ON payment USING btree (payment_date, payment_id);
+CREATE INDEX IF NOT EXISTS idx_payment_customer_id_payment_date ON payment USING btree (customer_id, payment_date, payment_id);
+
+ANALYZE payment;
@@ -1,17 +1,46 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from src.routes import (
-    actors, addresses, auth, categories, cities, countries, customers, 
-    films, inventory, languages, payments, rentals, staff, stores, views
+    actors, addresses, analytics, auth, availability, catalog, categories, cities, countries, customers, 
+    films, inventory, languages, payments, rentals, reports, staff, stores, views
 )
 from src.middleware.auth import AuthMiddleware
-from src.utils.database import close_connection_pool
+from src.middleware.compression import CompressionMiddleware
+from src.middleware.replica import ReplicaRoutingMiddleware
+from src.middleware.timing import TimingMiddleware
+from src.utils.cache import get_cache_stats
+from src.utils.metrics import render_metrics
+from src.utils.reports import get_refresh_interval, refresh_reports_periodically
+from src.utils.database import (
+    close_async_connection_pool, get_pool_stats, get_prepared_stats, get_replica_url, open_async_connection_pool,
+    watch_replica_lag
+)
 from fastapi.openapi.utils import get_openapi
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the database connection pools and start report refreshes and replica lag checks on startup, drain them on shutdown"""
+    await open_async_connection_pool()
+    tasks = []
+    if get_refresh_interval() > 0:
+        tasks.append(asyncio.create_task(refresh_reports_periodically(get_refresh_interval())))
+    if get_replica_url() is not None:
+        tasks.append(asyncio.create_task(watch_replica_lag()))
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await close_async_connection_pool()
+
 app = FastAPI(
     title="Movie Rental API",
     description="API for managing movie rental database with client authentication",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware to allow requests from anywhere
@@ -21,27 +50,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["Link", "ETag", "X-Refreshed-At", "Server-Timing", "X-Missing-Ids"],  # Pagination cursors, conditional GET, report freshness, timings, batch gets
 )
 
 # Add authentication middleware
 auth_middleware = AuthMiddleware()
 app.middleware("http")(auth_middleware)
 
+# Send the queries of GET requests to the read replica, if one is configured
+app.middleware("http")(ReplicaRoutingMiddleware())
+
+# Time requests, queries and serialization (added last so it also times authentication)
+app.add_middleware(TimingMiddleware)
+
+# Compress response bodies the client accepts compressed (outermost, so it sees the final headers)
+app.add_middleware(CompressionMiddleware)
+
 # Include all route modules
 app.include_router(rentals.router, prefix="/api/v1", tags=["rentals"])
-# app.include_router(staff.router, prefix="/api/v1", tags=["staff"])
-# app.include_router(stores.router, prefix="/api/v1", tags=["stores"])
-# app.include_router(customers.router, prefix="/api/v1", tags=["customers"])
-# app.include_router(films.router, prefix="/api/v1", tags=["films"])
-# app.include_router(inventory.router, prefix="/api/v1", tags=["inventory"])
-# app.include_router(actors.router, prefix="/api/v1", tags=["actors"])
-# app.include_router(addresses.router, prefix="/api/v1", tags=["addresses"])
-# app.include_router(categories.router, prefix="/api/v1", tags=["categories"])
-# app.include_router(cities.router, prefix="/api/v1", tags=["cities"])
-# app.include_router(countries.router, prefix="/api/v1", tags=["countries"])
-# app.include_router(languages.router, prefix="/api/v1", tags=["languages"])
-# app.include_router(payments.router, prefix="/api/v1", tags=["payments"])
-# app.include_router(views.router, prefix="/api/v1", tags=["views"])
+app.include_router(staff.router, prefix="/api/v1", tags=["staff"])
+app.include_router(stores.router, prefix="/api/v1", tags=["stores"])
+app.include_router(customers.router, prefix="/api/v1", tags=["customers"])
+app.include_router(films.router, prefix="/api/v1", tags=["films"])
+app.include_router(inventory.router, prefix="/api/v1", tags=["inventory"])
+app.include_router(actors.router, prefix="/api/v1", tags=["actors"])
+app.include_router(addresses.router, prefix="/api/v1", tags=["addresses"])
+app.include_router(categories.router, prefix="/api/v1", tags=["categories"])
+app.include_router(cities.router, prefix="/api/v1", tags=["cities"])
+app.include_router(countries.router, prefix="/api/v1", tags=["countries"])
+app.include_router(languages.router, prefix="/api/v1", tags=["languages"])
+app.include_router(payments.router, prefix="/api/v1", tags=["payments"])
+app.include_router(views.router, prefix="/api/v1", tags=["views"])
+app.include_router(catalog.router, prefix="/api/v1", tags=["catalog"])
+app.include_router(availability.router, prefix="/api/v1", tags=["availability"])
+app.include_router(reports.router, prefix="/api/v1", tags=["reports"])
+app.include_router(analytics.router, prefix="/api/v1", tags=["analytics"])
 
 def custom_openapi():
     if app.openapi_schema:
@@ -57,26 +100,66 @@ def custom_openapi():
 
 app.openapi = custom_openapi
 
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Clean up resources on application shutdown"""
-    close_connection_pool()
-
 @app.get("/health")
 def read_root():
     return {"status": 200, "message": "Healthy"}
 
 @app.get("/health/db")
-def health_check_db():
+async def health_check_db():
     """Check database connectivity"""
     try:
-        from src.utils.database import db_connection
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT 1")
-                result = cur.fetchone()
+        from src.utils.database import async_db_connection
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT 1")
+                result = await cur.fetchone()
                 if result:
                     return {"status": 200, "message": "Database connection healthy"}
     except Exception as e:
-        return {"status": 500, "message": f"Database connection failed: {str(e)}"}
\ No newline at end of file
+        return {"status": 500, "message": f"Database connection failed: {str(e)}"}
+
+@app.get("/health/db/pool")
+async def health_check_db_pool():
+    """Get database connection pool and prepared statement statistics"""
+    stats = get_pool_stats()
+    if stats["pool_available"]:
+        stats["prepared_statements"] = await get_prepared_stats()
+    return stats
+
+@app.get("/health/cache")
+def health_check_cache():
+    """Get reference data cache statistics"""
+    return get_cache_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Request, query, pool and cache metrics in the Prometheus text format"""
+    gauges = []
+    pools = get_pool_stats()
+    for name, pool in (("primary", pools.get("async", {})), ("replica", pools.get("replica", {}))):
+        for key in ("pool_size", "pool_available", "requests_waiting"):
+            if key in pool.get("stats", {}):
+                gauges.append((f"db_{key}", f"psycopg_pool {key}", {"pool": name}, pool["stats"][key]))
+    if pools.get("replica", {}).get("configured"):
+        lag = pools["replica"]["lag_seconds"]
+        gauges.append(("db_replica_up", "Whether the read replica answered the last lag check", {}, int(lag is not None)))
+        if lag is not None:
+            gauges.append(("db_replica_lag_seconds", "Replay lag of the read replica at the last check", {}, lag))
+    prepared = await get_prepared_stats()
+    for name, sample in prepared.items():
+        gauges.append(("db_prepared_sampled_connections", "Idle pooled connections whose prepared statements were read",
+                       {"pool": name}, sample["sampled_connections"]))
+    for name, sample in prepared.items():
+        for statement, counts in sample["statements"].items():
+            gauges.append(("db_prepared_statement_connections", "Sampled connections holding a registered statement prepared",
+                           {"pool": name, "statement": statement}, counts["connections"]))
+    for name, sample in prepared.items():
+        for statement, counts in sample["statements"].items():
+            for plan in ("generic", "custom"):
+                gauges.append(("db_prepared_statement_executions",
+                               "Executions of a registered statement since the sampled connections prepared it, by plan",
+                               {"pool": name, "statement": statement, "plan": plan}, counts[f"{plan}_plans"]))
+    for name, stats in get_cache_stats().items():
+        gauges.append(("cache_entries", "Entries held by an in-process cache", {"cache": name}, stats["entries"]))
+        gauges.append(("cache_hit_rate", "Hit rate of an in-process cache", {"cache": name}, stats["hit_rate"] or 0))
+    return PlainTextResponse(render_metrics(gauges), media_type="text/plain; version=0.0.4")
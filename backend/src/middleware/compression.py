@@ -0,0 +1,167 @@
+import os
+import zlib
+from typing import Callable, Dict, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from src.utils.responses import parse_accept
+
+# Brotli and zstd ship as the optional brotli and zstandard packages; gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Responses smaller than this many bytes are sent as they are
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# Levels trading a little ratio for CPU: bodies are compressed on every request
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+
+COMPRESSIBLE_TYPES = {
+    "application/json", "application/x-ndjson", "application/msgpack", "application/x-msgpack",
+    "application/cbor", "application/javascript", "image/svg+xml",
+}
+
+class GzipCompressor:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class BrotliCompressor:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._compressor.process(data) + (self._compressor.finish() if final else self._compressor.flush())
+
+class ZstdCompressor:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+# Content-Encoding -> compressor class, in the order preferred when a client accepts several equally
+ENCODERS: Dict[str, Callable] = {}
+if zstandard is not None:
+    ENCODERS["zstd"] = ZstdCompressor
+if brotli is not None:
+    ENCODERS["br"] = BrotliCompressor
+ENCODERS["gzip"] = GzipCompressor
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The available Content-Encoding an Accept-Encoding header weighs highest, None for identity"""
+    weights = dict(parse_accept(accept_encoding))
+    chosen, chosen_weight = None, 0.0
+    for encoding in ENCODERS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > chosen_weight:
+            chosen, chosen_weight = encoding, weight
+    return chosen
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """A whole body compressed with the given Content-Encoding"""
+    return ENCODERS[encoding]().compress(body, final=True)
+
+def compressible(content_type: Optional[str]) -> bool:
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies with zstd, Brotli or gzip, whichever the
+    request's Accept-Encoding weighs highest (zstd first on a tie), when
+    their content type compresses well and they are at least
+    COMPRESSION_MIN_SIZE bytes. Streamed bodies (exports) are compressed
+    chunk by chunk, each flushed so the client can decode it on arrival.
+
+    Strong ETags become weak ones, as the compressed bytes differ from the
+    ones they were computed from; If-None-Match compares them weakly.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size))
+
+class _CompressingSend:
+    """
+    The ASGI send of one response. Its start message is held back until the
+    body (or, for streams without a Content-Length, its first chunk) shows
+    whether to compress it.
+    """
+
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.pending = []
+        self.compressor = None
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+        body, more = message.get("body", b""), message.get("more_body", False)
+        if self.compressor is not None:
+            await self.send({**message, "body": self.compressor.compress(body, final=not more)})
+            return
+        if self.start is None:
+            await self.send(message)
+            return
+
+        headers = MutableHeaders(raw=self.start["headers"])
+        if more and "content-length" in headers:
+            # A body of known size sent in chunks (as through BaseHTTPMiddleware) is compressed whole
+            self.pending.append(body)
+            return
+        if self.pending:
+            body, self.pending = b"".join(self.pending) + body, []
+            message = {**message, "body": body}
+        start, self.start = self.start, None
+        if start["status"] == 304:
+            # Carries the validators of the compressed response it stands for
+            _weaken_etag(headers)
+            headers.add_vary_header("Accept-Encoding")
+        if ("content-encoding" in headers or not compressible(headers.get("content-type"))
+                or (not more and len(body) < self.minimum_size)):
+            await self.send(start)
+            await self.send(message)
+            return
+        self.compressor = ENCODERS[self.encoding]()
+        body = self.compressor.compress(body, final=not more)
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        _weaken_etag(headers)
+        if not more:
+            headers["Content-Length"] = str(len(body))
+        await self.send(start)
+        await self.send({**message, "body": body})
+
+def _weaken_etag(headers: MutableHeaders):
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
@@ -0,0 +1,38 @@
+import math
+import time
+from fastapi import Request
+from src.utils.database import get_replica_settings, get_replica_url, set_read_routing
+
+# Cookie holding the time until which a client's reads stay on the primary
+STICKY_COOKIE = "db_primary_until"
+
+READ_METHODS = ("GET", "HEAD")
+
+class ReplicaRoutingMiddleware:
+    """
+    Routes the queries of GET and HEAD requests to the read replica, when
+    DATABASE_REPLICA_URL is set (see async_db_connection()).
+
+    A successful write sets a cookie keeping that client's reads on the
+    primary for REPLICA_STICKY_SECONDS, so it reads its own writes even
+    while the replica is catching up. Clients that don't keep cookies can
+    send the cookie back themselves.
+    """
+
+    async def __call__(self, request: Request, call_next):
+        if get_replica_url() is None:
+            return await call_next(request)
+        if request.method in READ_METHODS:
+            try:
+                sticky = float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+            except ValueError:
+                sticky = False
+            set_read_routing("sticky" if sticky else "read")
+            return await call_next(request)
+        set_read_routing(None)
+        response = await call_next(request)
+        if response.status_code < 400:
+            seconds = get_replica_settings()["sticky_seconds"]
+            response.set_cookie(STICKY_COOKIE, f"{time.time() + seconds:.3f}", max_age=math.ceil(seconds),
+                                httponly=True, samesite="lax")
+        return response
@@ -0,0 +1,39 @@
+import time
+from starlette.datastructures import MutableHeaders
+from src.utils.metrics import record_request, server_timing, start_request
+
+class TimingMiddleware:
+    """
+    Collects per-request timings: the database layer and response
+    serialization add to them (src/utils/metrics.py), and the totals are
+    recorded per route template for /metrics and sent back in a
+    Server-Timing header.
+
+    A plain ASGI middleware, so a request is recorded once the application
+    has sent the last chunk of its body: streamed responses (exports) are
+    timed in full. Their Server-Timing header goes out with the response
+    start, before the body, and only covers the time until then.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timing = start_request(scope)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", server_timing(timing, time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            record_request(timing, scope["method"], status, time.perf_counter() - start)
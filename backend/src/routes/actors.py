@@ -1,52 +1,63 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request
+from psycopg.rows import dict_row
+from typing import List, Optional
 from src.schemas.actor import Actor
-from src.utils.database import db_connection
+from src.utils.batch import batch_get
+from src.utils.database import async_db_connection
+from src.utils.fields import Fields, sparse_get
+from src.utils.pagination import Keyset
+from src.utils.responses import list_response, model_response
 
 router = APIRouter()
 
 @router.get("/actors", response_model=List[Actor])
-async def get_actors(limit: int = 100, offset: int = 0):
-    """Get all actors with pagination"""
+async def get_actors(request: Request,
+                     ids: Optional[str] = Query(None, description="Comma-separated ids to fetch instead of a page"),
+                     fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                     limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get all actors with pagination, or the actors with the given ids"""
+    if ids is not None:
+        return await batch_get(request, Actor, "actor", "actor_id", ids, fields)
+    keyset = Keyset(("actor_id",), after=after, before=before)
+    selected = Fields(Actor, fields, always=keyset.columns)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT actor_id, first_name, last_name, last_update FROM actor ORDER BY actor_id LIMIT %s OFFSET %s",
-                    (limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"SELECT {selected.columns} FROM actor WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                    (*keyset.params, limit, keyset.offset(offset))
                 )
-                actors = []
-                for row in cur.fetchall():
-                    actors.append(Actor(
-                        actor_id=row[0],
-                        first_name=row[1],
-                        last_name=row[2],
-                        last_update=row[3]
-                    ))
-                return actors
+                actors = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, actors, request)
+                keyset.set_link_header(request, response, actors, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/actors/{actor_id}", response_model=Actor)
-async def get_actor(actor_id: int):
+async def get_actor(request: Request, actor_id: int,
+                    fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all")):
     """Get a specific actor by ID"""
+    if fields is not None:
+        return await sparse_get(request, Actor, "actor", "actor_id", actor_id, fields, "Actor not found")
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     "SELECT actor_id, first_name, last_name, last_update FROM actor WHERE actor_id = %s",
                     (actor_id,)
                 )
-                row = cur.fetchone()
+                row = await cur.fetchone()
                 if not row:
                     raise HTTPException(status_code=404, detail="Actor not found")
                 
-                return Actor(
+                actor = Actor(
                     actor_id=row[0],
                     first_name=row[1],
                     last_name=row[2],
                     last_update=row[3]
                 )
+                return model_response(request, actor, actor.last_update)
     except HTTPException:
         raise
     except Exception as e:
@@ -56,14 +67,14 @@ async def get_actor(actor_id: int):
 async def create_actor(actor: Actor):
     """Create a new actor"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     "INSERT INTO actor (first_name, last_name, last_update) VALUES (%s, %s, %s) RETURNING actor_id",
                     (actor.first_name, actor.last_name, actor.last_update)
                 )
-                actor_id = cur.fetchone()[0]
-                conn.commit()
+                actor_id = (await cur.fetchone())[0]
+                await conn.commit()
                 
                 return Actor(
                     actor_id=actor_id,
@@ -78,15 +89,15 @@ async def create_actor(actor: Actor):
 async def update_actor(actor_id: int, actor: Actor):
     """Update an existing actor"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     "UPDATE actor SET first_name = %s, last_name = %s, last_update = %s WHERE actor_id = %s",
                     (actor.first_name, actor.last_name, actor.last_update, actor_id)
                 )
                 if cur.rowcount == 0:
                     raise HTTPException(status_code=404, detail="Actor not found")
-                conn.commit()
+                await conn.commit()
                 
                 return Actor(
                     actor_id=actor_id,
@@ -103,12 +114,12 @@ async def update_actor(actor_id: int, actor: Actor):
 async def delete_actor(actor_id: int):
     """Delete an actor"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("DELETE FROM actor WHERE actor_id = %s", (actor_id,))
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("DELETE FROM actor WHERE actor_id = %s", (actor_id,))
                 if cur.rowcount == 0:
                     raise HTTPException(status_code=404, detail="Actor not found")
-                conn.commit()
+                await conn.commit()
                 return {"status": 200, "message": "Actor deleted successfully"}
     except HTTPException:
         raise
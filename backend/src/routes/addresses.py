@@ -1,53 +1,59 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request
+from psycopg.rows import dict_row
+from typing import List, Optional
 from src.schemas.address import Address
-from src.utils.database import db_connection
+from src.utils.batch import batch_get
+from src.utils.database import async_db_connection
+from src.utils.fields import Fields, sparse_get
+from src.utils.pagination import Keyset
+from src.utils.responses import list_response, model_response
 
 router = APIRouter()
 
 @router.get("/addresses", response_model=List[Address])
-async def get_addresses(limit: int = 100, offset: int = 0):
-    """Get all addresses with pagination"""
+async def get_addresses(request: Request,
+                        ids: Optional[str] = Query(None, description="Comma-separated ids to fetch instead of a page"),
+                        fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                        limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get all addresses with pagination, or the addresses with the given ids"""
+    if ids is not None:
+        return await batch_get(request, Address, "address", "address_id", ids, fields)
+    keyset = Keyset(("address_id",), after=after, before=before)
+    selected = Fields(Address, fields, always=keyset.columns)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """SELECT address_id, address, address2, district, city_id, postal_code, phone, last_update 
-                       FROM address ORDER BY address_id LIMIT %s OFFSET %s""",
-                    (limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"""SELECT {selected.columns} 
+                       FROM address WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s""",
+                    (*keyset.params, limit, keyset.offset(offset))
                 )
-                addresses = []
-                for row in cur.fetchall():
-                    addresses.append(Address(
-                        address_id=row[0],
-                        address=row[1],
-                        address2=row[2],
-                        district=row[3],
-                        city_id=row[4],
-                        postal_code=row[5],
-                        phone=row[6],
-                        last_update=row[7]
-                    ))
-                return addresses
+                addresses = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, addresses, request)
+                keyset.set_link_header(request, response, addresses, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/addresses/{address_id}", response_model=Address)
-async def get_address(address_id: int):
+async def get_address(request: Request, address_id: int,
+                      fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all")):
     """Get a specific address by ID"""
+    if fields is not None:
+        return await sparse_get(request, Address, "address", "address_id", address_id, fields, "Address not found")
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """SELECT address_id, address, address2, district, city_id, postal_code, phone, last_update 
                        FROM address WHERE address_id = %s""",
                     (address_id,)
                 )
-                row = cur.fetchone()
+                row = await cur.fetchone()
                 if not row:
                     raise HTTPException(status_code=404, detail="Address not found")
                 
-                return Address(
+                address = Address(
                     address_id=row[0],
                     address=row[1],
                     address2=row[2],
@@ -57,6 +63,7 @@ async def get_address(address_id: int):
                     phone=row[6],
                     last_update=row[7]
                 )
+                return model_response(request, address, address.last_update)
     except HTTPException:
         raise
     except Exception as e:
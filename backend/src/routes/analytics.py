@@ -0,0 +1,35 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from datetime import datetime, timezone
+from psycopg.rows import dict_row
+from typing import List, Optional
+from src.schemas.analytics import RevenuePoint
+from src.utils.analytics import RevenueBucket, RevenueGroup, month_start, parse_month, revenue
+from src.utils.database import async_db_connection
+from src.utils.responses import list_response
+
+router = APIRouter()
+
+@router.get("/analytics/revenue", response_model=List[RevenuePoint])
+async def get_revenue(request: Request, bucket: RevenueBucket = RevenueBucket.MONTH,
+                      group_by: RevenueGroup = RevenueGroup.NONE,
+                      from_month: Optional[str] = Query(None, alias="from", description="YYYY-MM, defaults to the first payment's month"),
+                      to_month: Optional[str] = Query(None, alias="to", description="YYYY-MM (inclusive), defaults to this month")):
+    """Get revenue per day, week or month, optionally per store, staff member or category"""
+    first_month = parse_month(from_month, "from")
+    last_month = parse_month(to_month, "to") or month_start(datetime.now(timezone.utc).date())
+    if first_month and first_month > last_month:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    try:
+        async with async_db_connection(cache_fill=True) as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                if first_month is None:
+                    await cur.execute("SELECT date_trunc('month', min(payment_date))::date AS month FROM payment")
+                    first_month = (await cur.fetchone())["month"]
+                    if first_month is None or first_month > last_month:
+                        return list_response(RevenuePoint, [], request)
+                rows = await revenue(cur, bucket, group_by, first_month, last_month)
+                return list_response(RevenuePoint, rows, request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
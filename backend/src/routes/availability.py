@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import List
+from src.schemas.availability import FilmAvailability
+from src.utils.availability import (
+    availability_cache, cached_availability, fetch_availability, parse_film_ids
+)
+from src.utils.database import async_db_connection
+from src.utils.responses import list_response
+
+router = APIRouter()
+
+@router.get("/availability", response_model=List[FilmAvailability])
+async def get_availability(request: Request, film_ids: str = Query(..., description="Comma-separated film ids"),
+                           store_id: int = Query(...)):
+    """Get the stock of many films at a store"""
+    ids = parse_film_ids(film_ids)
+    cached = cached_availability(store_id, ids)
+    missing = [film_id for film_id in ids if film_id not in cached]
+    if missing:
+        generation = availability_cache.generation()
+        try:
+            async with async_db_connection(cache_fill=True) as conn:
+                async with conn.cursor() as cur:
+                    rows = await fetch_availability(cur, store_id, missing)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        for row in rows:
+            availability_cache.set((store_id, row["film_id"]), row, if_generation=generation)
+        cached.update((row["film_id"], row) for row in rows)
+    return list_response(FilmAvailability, [cached[film_id] for film_id in ids], request)
@@ -0,0 +1,82 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from psycopg.rows import dict_row
+from typing import List, Optional
+from src.schemas.catalog import FilmCatalog
+from src.schemas.views import FilmList, NicerButSlowerFilmList
+from src.utils.database import async_db_connection
+from src.utils.fields import Fields
+from src.utils.pagination import Keyset
+from src.utils.responses import list_response
+
+router = APIRouter()
+
+@router.get("/catalog/films", response_model=List[FilmCatalog])
+async def get_film_catalog(request: Request,
+                           fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                           limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get the denormalized film catalog with pagination"""
+    keyset = Keyset(("film_id",), after=after, before=before)
+    selected = Fields(FilmCatalog, fields, always=keyset.columns)
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"SELECT {selected.columns} FROM film_catalog WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                    (*keyset.params, limit, keyset.offset(offset))
+                )
+                films = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, films, request)
+                keyset.set_link_header(request, response, films, limit, offset)
+                return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.get("/catalog/film-list", response_model=List[FilmList])
+async def get_catalog_film_list(request: Request,
+                                fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                                limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get the film list (same shape as /views/film-list) from the film catalog"""
+    keyset = Keyset(("fid",), after=after, before=before)
+    selected = Fields(FilmList, fields, always=keyset.columns)
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"""SELECT {selected.columns} FROM (
+                            SELECT film_id AS fid, title, description, category, price, length, rating,
+                                   nullif(array_to_string(actors, ', '), '') AS actors
+                            FROM film_catalog
+                        ) film_list WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s""",
+                    (*keyset.params, limit, keyset.offset(offset))
+                )
+                films = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, films, request)
+                keyset.set_link_header(request, response, films, limit, offset)
+                return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.get("/catalog/nicer-film-list", response_model=List[NicerButSlowerFilmList])
+async def get_catalog_nicer_film_list(request: Request,
+                                      fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                                      limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get the nicer film list (same shape as /views/nicer-film-list) from the film catalog"""
+    keyset = Keyset(("fid",), after=after, before=before)
+    selected = Fields(NicerButSlowerFilmList, fields, always=keyset.columns)
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"""SELECT {selected.columns} FROM (
+                            SELECT film_id AS fid, title, description, category, price, length, rating,
+                                   nullif(array_to_string(nicer_actors, ', '), '') AS actors
+                            FROM film_catalog
+                        ) film_list WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s""",
+                    (*keyset.params, limit, keyset.offset(offset))
+                )
+                films = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, films, request)
+                keyset.set_link_header(request, response, films, limit, offset)
+                return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
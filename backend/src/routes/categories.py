@@ -1,51 +1,138 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request
+from psycopg.rows import dict_row
+from typing import List, Optional
 from src.schemas.category import Category
-from src.utils.database import db_connection
+from src.utils.batch import batch_get
+from src.utils.cache import get_cache
+from src.utils.database import async_db_connection
+from src.utils.fields import Fields
+from src.utils.pagination import Keyset
+from src.utils.responses import json_response, list_json, list_response
 
 router = APIRouter()
+categories_cache = get_cache("categories")
 
 @router.get("/categories", response_model=List[Category])
-async def get_categories(limit: int = 100, offset: int = 0):
-    """Get all categories with pagination"""
-    try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT category_id, name, last_update FROM category ORDER BY category_id LIMIT %s OFFSET %s",
-                    (limit, offset)
-                )
-                categories = []
-                for row in cur.fetchall():
-                    categories.append(Category(
-                        category_id=row[0],
-                        name=row[1],
-                        last_update=row[2]
-                    ))
-                return categories
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+async def get_categories(request: Request,
+                         ids: Optional[str] = Query(None, description="Comma-separated ids to fetch instead of a page"),
+                         fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                         limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get all categories with pagination, or the categories with the given ids"""
+    if ids is not None:
+        return await batch_get(request, Category, "category", "category_id", ids, fields)
+    keyset = Keyset(("category_id",), after=after, before=before)
+    selected = Fields(Category, fields)
+    cache_key = ("list", limit, offset, after, before)
+    cached = categories_cache.get(cache_key)
+    if cached is None:
+        generation = categories_cache.generation()
+        try:
+            async with async_db_connection(cache_fill=True) as conn:
+                async with conn.cursor(row_factory=dict_row) as cur:
+                    await cur.execute(
+                        f"SELECT category_id, name, last_update FROM category WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                        (*keyset.params, limit, keyset.offset(offset))
+                    )
+                    categories = keyset.page(await cur.fetchall())
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        cached = categories_cache.set(cache_key, (categories, list_json(Category, categories)), if_generation=generation)
+    categories, body = cached
+    # The cache holds whole rows (a few small columns): fields only narrows the body
+    response = list_response(selected.model, categories, request) if selected.partial else json_response(body, request)
+    keyset.set_link_header(request, response, categories, limit, offset)
+    return response
 
 @router.get("/categories/{category_id}", response_model=Category)
-async def get_category(category_id: int):
+async def get_category(request: Request, category_id: int,
+                       fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all")):
     """Get a specific category by ID"""
+    selected = Fields(Category, fields)
+    category = categories_cache.get(("id", category_id))
+    if category is not None:
+        return selected.response(request, category)
+    generation = categories_cache.generation()
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection(cache_fill=True) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     "SELECT category_id, name, last_update FROM category WHERE category_id = %s",
                     (category_id,)
                 )
-                row = cur.fetchone()
+                row = await cur.fetchone()
                 if not row:
                     raise HTTPException(status_code=404, detail="Category not found")
                 
-                return Category(
+                return selected.response(request, categories_cache.set(("id", category_id), Category(
                     category_id=row[0],
                     name=row[1],
                     last_update=row[2]
+                ), if_generation=generation))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.post("/categories", response_model=Category)
+async def create_category(category: Category):
+    """Create a new category"""
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "INSERT INTO category (name, last_update) VALUES (%s, %s) RETURNING category_id",
+                    (category.name, category.last_update)
+                )
+                category_id = (await cur.fetchone())[0]
+                await conn.commit()
+                categories_cache.invalidate()
+                
+                return Category(
+                    category_id=category_id,
+                    name=category.name,
+                    last_update=category.last_update
+                )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.put("/categories/{category_id}", response_model=Category)
+async def update_category(category_id: int, category: Category):
+    """Update an existing category"""
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "UPDATE category SET name = %s, last_update = %s WHERE category_id = %s",
+                    (category.name, category.last_update, category_id)
+                )
+                if cur.rowcount == 0:
+                    raise HTTPException(status_code=404, detail="Category not found")
+                await conn.commit()
+                categories_cache.invalidate()
+                
+                return Category(
+                    category_id=category_id,
+                    name=category.name,
+                    last_update=category.last_update
                 )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.delete("/categories/{category_id}")
+async def delete_category(category_id: int):
+    """Delete a category"""
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("DELETE FROM category WHERE category_id = %s", (category_id,))
+                if cur.rowcount == 0:
+                    raise HTTPException(status_code=404, detail="Category not found")
+                await conn.commit()
+                categories_cache.invalidate()
+                return {"status": 200, "message": "Category deleted successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -1,75 +1,169 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request
+from psycopg.rows import dict_row
+from typing import List, Optional
 from src.schemas.city import City
-from src.utils.database import db_connection
+from src.utils.batch import batch_get
+from src.utils.cache import get_cache
+from src.utils.database import async_db_connection
+from src.utils.fields import Fields
+from src.utils.pagination import Keyset
+from src.utils.responses import json_response, list_json, list_response
 
 router = APIRouter()
+cities_cache = get_cache("cities")
 
 @router.get("/cities", response_model=List[City])
-async def get_cities(limit: int = 100, offset: int = 0):
-    """Get all cities with pagination"""
-    try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT city_id, city, country_id, last_update FROM city ORDER BY city_id LIMIT %s OFFSET %s",
-                    (limit, offset)
-                )
-                cities = []
-                for row in cur.fetchall():
-                    cities.append(City(
-                        city_id=row[0],
-                        city=row[1],
-                        country_id=row[2],
-                        last_update=row[3]
-                    ))
-                return cities
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+async def get_cities(request: Request,
+                     ids: Optional[str] = Query(None, description="Comma-separated ids to fetch instead of a page"),
+                     fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                     limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get all cities with pagination, or the cities with the given ids"""
+    if ids is not None:
+        return await batch_get(request, City, "city", "city_id", ids, fields)
+    keyset = Keyset(("city_id",), after=after, before=before)
+    selected = Fields(City, fields)
+    cache_key = ("list", limit, offset, after, before)
+    cached = cities_cache.get(cache_key)
+    if cached is None:
+        generation = cities_cache.generation()
+        try:
+            async with async_db_connection(cache_fill=True) as conn:
+                async with conn.cursor(row_factory=dict_row) as cur:
+                    await cur.execute(
+                        f"SELECT city_id, city, country_id, last_update FROM city WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                        (*keyset.params, limit, keyset.offset(offset))
+                    )
+                    cities = keyset.page(await cur.fetchall())
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        cached = cities_cache.set(cache_key, (cities, list_json(City, cities)), if_generation=generation)
+    cities, body = cached
+    # The cache holds whole rows (a few small columns): fields only narrows the body
+    response = list_response(selected.model, cities, request) if selected.partial else json_response(body, request)
+    keyset.set_link_header(request, response, cities, limit, offset)
+    return response
 
 @router.get("/cities/{city_id}", response_model=City)
-async def get_city(city_id: int):
+async def get_city(request: Request, city_id: int,
+                   fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all")):
     """Get a specific city by ID"""
+    selected = Fields(City, fields)
+    city = cities_cache.get(("id", city_id))
+    if city is not None:
+        return selected.response(request, city)
+    generation = cities_cache.generation()
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection(cache_fill=True) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     "SELECT city_id, city, country_id, last_update FROM city WHERE city_id = %s",
                     (city_id,)
                 )
-                row = cur.fetchone()
+                row = await cur.fetchone()
                 if not row:
                     raise HTTPException(status_code=404, detail="City not found")
                 
-                return City(
+                return selected.response(request, cities_cache.set(("id", city_id), City(
                     city_id=row[0],
                     city=row[1],
                     country_id=row[2],
                     last_update=row[3]
-                )
+                ), if_generation=generation))
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/cities/country/{country_id}", response_model=List[City])
-async def get_cities_by_country(country_id: int, limit: int = 100, offset: int = 0):
+async def get_cities_by_country(request: Request, country_id: int,
+                                fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                                limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
     """Get all cities for a specific country"""
+    keyset = Keyset(("city", "city_id"), (str, int), after=after, before=before)
+    selected = Fields(City, fields)
+    cache_key = ("country", country_id, limit, offset, after, before)
+    cached = cities_cache.get(cache_key)
+    if cached is None:
+        generation = cities_cache.generation()
+        try:
+            async with async_db_connection(cache_fill=True) as conn:
+                async with conn.cursor(row_factory=dict_row) as cur:
+                    await cur.execute(
+                        f"SELECT city_id, city, country_id, last_update FROM city WHERE country_id = %s AND {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                        (country_id, *keyset.params, limit, keyset.offset(offset))
+                    )
+                    cities = keyset.page(await cur.fetchall())
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        cached = cities_cache.set(cache_key, (cities, list_json(City, cities)), if_generation=generation)
+    cities, body = cached
+    # The cache holds whole rows (a few small columns): fields only narrows the body
+    response = list_response(selected.model, cities, request) if selected.partial else json_response(body, request)
+    keyset.set_link_header(request, response, cities, limit, offset)
+    return response
+
+@router.post("/cities", response_model=City)
+async def create_city(city: City):
+    """Create a new city"""
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "INSERT INTO city (city, country_id, last_update) VALUES (%s, %s, %s) RETURNING city_id",
+                    (city.city, city.country_id, city.last_update)
+                )
+                city_id = (await cur.fetchone())[0]
+                await conn.commit()
+                cities_cache.invalidate()
+                
+                return City(
+                    city_id=city_id,
+                    city=city.city,
+                    country_id=city.country_id,
+                    last_update=city.last_update
+                )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.put("/cities/{city_id}", response_model=City)
+async def update_city(city_id: int, city: City):
+    """Update an existing city"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT city_id, city, country_id, last_update FROM city WHERE country_id = %s ORDER BY city LIMIT %s OFFSET %s",
-                    (country_id, limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "UPDATE city SET city = %s, country_id = %s, last_update = %s WHERE city_id = %s",
+                    (city.city, city.country_id, city.last_update, city_id)
                 )
-                cities = []
-                for row in cur.fetchall():
-                    cities.append(City(
-                        city_id=row[0],
-                        city=row[1],
-                        country_id=row[2],
-                        last_update=row[3]
-                    ))
-                return cities
+                if cur.rowcount == 0:
+                    raise HTTPException(status_code=404, detail="City not found")
+                await conn.commit()
+                cities_cache.invalidate()
+                
+                return City(
+                    city_id=city_id,
+                    city=city.city,
+                    country_id=city.country_id,
+                    last_update=city.last_update
+                )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.delete("/cities/{city_id}")
+async def delete_city(city_id: int):
+    """Delete a city"""
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("DELETE FROM city WHERE city_id = %s", (city_id,))
+                if cur.rowcount == 0:
+                    raise HTTPException(status_code=404, detail="City not found")
+                await conn.commit()
+                cities_cache.invalidate()
+                return {"status": 200, "message": "City deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
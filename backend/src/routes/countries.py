@@ -1,51 +1,138 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request
+from psycopg.rows import dict_row
+from typing import List, Optional
 from src.schemas.country import Country
-from src.utils.database import db_connection
+from src.utils.batch import batch_get
+from src.utils.cache import get_cache
+from src.utils.database import async_db_connection
+from src.utils.fields import Fields
+from src.utils.pagination import Keyset
+from src.utils.responses import json_response, list_json, list_response
 
 router = APIRouter()
+countries_cache = get_cache("countries")
 
 @router.get("/countries", response_model=List[Country])
-async def get_countries(limit: int = 100, offset: int = 0):
-    """Get all countries with pagination"""
-    try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT country_id, country, last_update FROM country ORDER BY country_id LIMIT %s OFFSET %s",
-                    (limit, offset)
-                )
-                countries = []
-                for row in cur.fetchall():
-                    countries.append(Country(
-                        country_id=row[0],
-                        country=row[1],
-                        last_update=row[2]
-                    ))
-                return countries
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+async def get_countries(request: Request,
+                        ids: Optional[str] = Query(None, description="Comma-separated ids to fetch instead of a page"),
+                        fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                        limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get all countries with pagination, or the countries with the given ids"""
+    if ids is not None:
+        return await batch_get(request, Country, "country", "country_id", ids, fields)
+    keyset = Keyset(("country_id",), after=after, before=before)
+    selected = Fields(Country, fields)
+    cache_key = ("list", limit, offset, after, before)
+    cached = countries_cache.get(cache_key)
+    if cached is None:
+        generation = countries_cache.generation()
+        try:
+            async with async_db_connection(cache_fill=True) as conn:
+                async with conn.cursor(row_factory=dict_row) as cur:
+                    await cur.execute(
+                        f"SELECT country_id, country, last_update FROM country WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                        (*keyset.params, limit, keyset.offset(offset))
+                    )
+                    countries = keyset.page(await cur.fetchall())
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        cached = countries_cache.set(cache_key, (countries, list_json(Country, countries)), if_generation=generation)
+    countries, body = cached
+    # The cache holds whole rows (a few small columns): fields only narrows the body
+    response = list_response(selected.model, countries, request) if selected.partial else json_response(body, request)
+    keyset.set_link_header(request, response, countries, limit, offset)
+    return response
 
 @router.get("/countries/{country_id}", response_model=Country)
-async def get_country(country_id: int):
+async def get_country(request: Request, country_id: int,
+                      fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all")):
     """Get a specific country by ID"""
+    selected = Fields(Country, fields)
+    country = countries_cache.get(("id", country_id))
+    if country is not None:
+        return selected.response(request, country)
+    generation = countries_cache.generation()
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection(cache_fill=True) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     "SELECT country_id, country, last_update FROM country WHERE country_id = %s",
                     (country_id,)
                 )
-                row = cur.fetchone()
+                row = await cur.fetchone()
                 if not row:
                     raise HTTPException(status_code=404, detail="Country not found")
                 
-                return Country(
+                return selected.response(request, countries_cache.set(("id", country_id), Country(
                     country_id=row[0],
                     country=row[1],
                     last_update=row[2]
+                ), if_generation=generation))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.post("/countries", response_model=Country)
+async def create_country(country: Country):
+    """Create a new country"""
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "INSERT INTO country (country, last_update) VALUES (%s, %s) RETURNING country_id",
+                    (country.country, country.last_update)
+                )
+                country_id = (await cur.fetchone())[0]
+                await conn.commit()
+                countries_cache.invalidate()
+                
+                return Country(
+                    country_id=country_id,
+                    country=country.country,
+                    last_update=country.last_update
+                )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.put("/countries/{country_id}", response_model=Country)
+async def update_country(country_id: int, country: Country):
+    """Update an existing country"""
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "UPDATE country SET country = %s, last_update = %s WHERE country_id = %s",
+                    (country.country, country.last_update, country_id)
+                )
+                if cur.rowcount == 0:
+                    raise HTTPException(status_code=404, detail="Country not found")
+                await conn.commit()
+                countries_cache.invalidate()
+                
+                return Country(
+                    country_id=country_id,
+                    country=country.country,
+                    last_update=country.last_update
                 )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.delete("/countries/{country_id}")
+async def delete_country(country_id: int):
+    """Delete a country"""
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("DELETE FROM country WHERE country_id = %s", (country_id,))
+                if cur.rowcount == 0:
+                    raise HTTPException(status_code=404, detail="Country not found")
+                await conn.commit()
+                countries_cache.invalidate()
+                return {"status": 200, "message": "Country deleted successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
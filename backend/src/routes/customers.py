@@ -1,53 +1,91 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timezone
+from psycopg.rows import dict_row
 from typing import List, Optional
+from src.schemas.address import Address
+from src.schemas.city import City
+from src.schemas.country import Country
 from src.schemas.customer import Customer
-from src.utils.database import db_connection
+from src.schemas.profile import CustomerProfile, ProfileSection
+from src.utils.balances import BALANCE_COLUMNS, MAX_BALANCE_CUSTOMERS, balances_query
+from src.utils.batch import batch_get
+from src.utils.database import async_db_connection, execute_pipelined, execute_prepared, register_statement
+from src.utils.export import MEDIA_TYPES, ExportFormat, stream_query
+from src.utils.metrics import timed_serialization
+from src.utils.fields import Fields, sparse_get
+from src.utils.pagination import Keyset
+from src.utils.params import parse_id_list
+from src.utils.responses import json_response, list_response, model_response
 
 router = APIRouter()
 
+CUSTOMER_BY_ID = register_statement(
+    "customer_by_id",
+    "SELECT customer_id, store_id, first_name, last_name, email, address_id, activebool, create_date, last_update, active FROM customer WHERE customer_id = %s"
+)
+
+# Profile parts read with the customer's row: part -> (alias, model, join)
+PROFILE_JOINS = {
+    "customer": ("c", Customer, "customer c"),
+    "address": ("a", Address, "JOIN address a ON a.address_id = c.address_id"),
+    "city": ("ci", City, "JOIN city ci ON ci.city_id = a.city_id"),
+    "country": ("co", Country, "JOIN country co ON co.country_id = ci.country_id"),
+}
+
 @router.get("/customers", response_model=List[Customer])
-async def get_customers(limit: int = 100, offset: int = 0):
-    """Get all customers with pagination"""
+async def get_customers(request: Request,
+                        ids: Optional[str] = Query(None, description="Comma-separated ids to fetch instead of a page"),
+                        fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                        limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get all customers with pagination, or the customers with the given ids"""
+    if ids is not None:
+        return await batch_get(request, Customer, "customer", "customer_id", ids, fields)
+    keyset = Keyset(("customer_id",), after=after, before=before)
+    selected = Fields(Customer, fields, always=keyset.columns)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT customer_id, store_id, first_name, last_name, email, address_id, activebool, create_date, last_update, active FROM customer ORDER BY customer_id LIMIT %s OFFSET %s",
-                    (limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"SELECT {selected.columns} FROM customer WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                    (*keyset.params, limit, keyset.offset(offset))
                 )
-                customers = []
-                for row in cur.fetchall():
-                    customers.append(Customer(
-                        customer_id=row[0],
-                        store_id=row[1],
-                        first_name=row[2],
-                        last_name=row[3],
-                        email=row[4],
-                        address_id=row[5],
-                        activebool=row[6],
-                        create_date=row[7],
-                        last_update=row[8],
-                        active=row[9]
-                    ))
-                return customers
+                customers = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, customers, request)
+                keyset.set_link_header(request, response, customers, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@router.get("/customers/balances")
+async def get_customer_balances(customer_ids: Optional[str] = None, active: Optional[bool] = None,
+                                as_of: Optional[datetime] = None, format: ExportFormat = ExportFormat.NDJSON):
+    """
+    Stream the balances of many customers (all when customer_ids is not given)
+    as NDJSON or CSV, computed as get_customer_balance() would as of `as_of`.
+    """
+    ids = parse_id_list(customer_ids, "customer_ids", MAX_BALANCE_CUSTOMERS) if customer_ids is not None else None
+    sql, params = balances_query(as_of or datetime.now(timezone.utc), ids, active)
+    return StreamingResponse(
+        stream_query("customer_balances", sql, params, BALANCE_COLUMNS, format),
+        media_type=MEDIA_TYPES[format]
+    )
+
 @router.get("/customers/{customer_id}", response_model=Customer)
-async def get_customer(customer_id: int):
+async def get_customer(request: Request, customer_id: int,
+                       fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all")):
     """Get a specific customer by ID"""
+    if fields is not None:
+        return await sparse_get(request, Customer, "customer", "customer_id", customer_id, fields, "Customer not found")
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT customer_id, store_id, first_name, last_name, email, address_id, activebool, create_date, last_update, active FROM customer WHERE customer_id = %s",
-                    (customer_id,)
-                )
-                row = cur.fetchone()
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute_prepared(cur, CUSTOMER_BY_ID, (customer_id,))
+                row = await cur.fetchone()
                 if not row:
                     raise HTTPException(status_code=404, detail="Customer not found")
                 
-                return Customer(
+                customer = Customer(
                     customer_id=row[0],
                     store_id=row[1],
                     first_name=row[2],
@@ -59,25 +97,91 @@ async def get_customer(customer_id: int):
                     last_update=row[8],
                     active=row[9]
                 )
+                return model_response(request, customer, customer.last_update)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@router.get("/customers/{customer_id}/profile", response_model=CustomerProfile, response_model_exclude_unset=True)
+async def get_customer_profile(request: Request, customer_id: int,
+                               include: Optional[str] = Query(None, description="Comma-separated sections: address, rentals, payments, total (default: all)"),
+                               limit: int = 20):
+    """
+    Get a customer with their address, city and country, latest `limit`
+    rentals and payments, and total paid, over a single connection.
+
+    The customer is joined to its address, city and country, and the
+    rentals, payments and total are sent in the same pipeline, so the
+    profile costs one round trip to Postgres instead of seven requests.
+    """
+    sections = parse_profile_sections(include)
+    parts = ["customer", "address", "city", "country"] if ProfileSection.ADDRESS in sections else ["customer"]
+    columns = ", ".join(
+        f'{PROFILE_JOINS[part][0]}.{field} AS "{part}.{field}"' for part in parts for field in PROFILE_JOINS[part][1].model_fields
+    )
+    queries = {"profile": (
+        f"SELECT {columns} FROM {' '.join(PROFILE_JOINS[part][2] for part in parts)} WHERE c.customer_id = %s", (customer_id,)
+    )}
+    if ProfileSection.RENTALS in sections:
+        queries["rentals"] = (
+            """SELECT rental_id, rental_date, inventory_id, customer_id, return_date, staff_id, last_update
+               FROM rental WHERE customer_id = %s ORDER BY rental_date DESC, rental_id DESC LIMIT %s""",
+            (customer_id, limit)
+        )
+    if ProfileSection.PAYMENTS in sections:
+        queries["payments"] = (
+            """SELECT payment_id, customer_id, staff_id, rental_id, amount, payment_date
+               FROM payment WHERE customer_id = %s ORDER BY payment_date DESC, payment_id DESC LIMIT %s""",
+            (customer_id, limit)
+        )
+    if ProfileSection.TOTAL in sections:
+        queries["total_payments"] = ("SELECT COALESCE(SUM(amount), 0) AS total FROM payment WHERE customer_id = %s", (customer_id,))
+    try:
+        async with async_db_connection() as conn:
+            results = dict(zip(queries, (result.rows for result in await execute_pipelined(conn, list(queries.values())))))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if not results["profile"]:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    profile = {part: {} for part in parts}
+    for column, value in results["profile"][0].items():
+        part, field = column.split(".")
+        profile[part][field] = value
+    for name in ("rentals", "payments"):
+        if name in results:
+            profile[name] = results[name]
+    if "total_payments" in results:
+        profile["total_payments"] = float(results["total_payments"][0]["total"])
+    with timed_serialization():
+        body = CustomerProfile.model_validate(profile).model_dump_json(exclude_unset=True).encode()
+    return json_response(body, request)
+
+def parse_profile_sections(include: Optional[str]) -> set:
+    """Sections named in a comma-separated `include` parameter, all of them when it is missing"""
+    if include is None:
+        return set(ProfileSection)
+    try:
+        return {ProfileSection(item.strip()) for item in include.split(",") if item.strip()}
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail=f"include must be a comma-separated list of: {', '.join(s.value for s in ProfileSection)}"
+        )
+
 @router.post("/customers", response_model=Customer)
 async def create_customer(customer: Customer):
     """Create a new customer"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """INSERT INTO customer (store_id, first_name, last_name, email, address_id, activebool, create_date, last_update, active) 
                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING customer_id""",
                     (customer.store_id, customer.first_name, customer.last_name, customer.email, 
                      customer.address_id, customer.activebool, customer.create_date, customer.last_update, customer.active)
                 )
-                customer_id = cur.fetchone()[0]
-                conn.commit()
+                customer_id = (await cur.fetchone())[0]
+                await conn.commit()
                 
                 return Customer(
                     customer_id=customer_id,
@@ -98,32 +202,31 @@ async def create_customer(customer: Customer):
 async def update_customer(customer_id: int, customer: Customer):
     """Update an existing customer"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """UPDATE customer SET store_id = %s, first_name = %s, last_name = %s, email = %s, 
-                       address_id = %s, activebool = %s, create_date = %s, last_update = %s, active = %s 
-                       WHERE customer_id = %s""",
-                    (customer.store_id, customer.first_name, customer.last_name, customer.email,
-                     customer.address_id, customer.activebool, customer.create_date, customer.last_update, 
-                     customer.active, customer_id)
-                )
-                if cur.rowcount == 0:
-                    raise HTTPException(status_code=404, detail="Customer not found")
-                conn.commit()
-                
-                return Customer(
-                    customer_id=customer_id,
-                    store_id=customer.store_id,
-                    first_name=customer.first_name,
-                    last_name=customer.last_name,
-                    email=customer.email,
-                    address_id=customer.address_id,
-                    activebool=customer.activebool,
-                    create_date=customer.create_date,
-                    last_update=customer.last_update,
-                    active=customer.active
-                )
+        async with async_db_connection() as conn:
+            # Committed with the pipeline's sync: one round trip, no BEGIN or COMMIT
+            (updated,) = await execute_pipelined(conn, [(
+                """UPDATE customer SET store_id = %s, first_name = %s, last_name = %s, email = %s, 
+                   address_id = %s, activebool = %s, create_date = %s, last_update = %s, active = %s 
+                   WHERE customer_id = %s""",
+                (customer.store_id, customer.first_name, customer.last_name, customer.email,
+                 customer.address_id, customer.activebool, customer.create_date, customer.last_update, 
+                 customer.active, customer_id)
+            )])
+            if updated.rowcount == 0:
+                raise HTTPException(status_code=404, detail="Customer not found")
+            
+            return Customer(
+                customer_id=customer_id,
+                store_id=customer.store_id,
+                first_name=customer.first_name,
+                last_name=customer.last_name,
+                email=customer.email,
+                address_id=customer.address_id,
+                activebool=customer.activebool,
+                create_date=customer.create_date,
+                last_update=customer.last_update,
+                active=customer.active
+            )
     except HTTPException:
         raise
     except Exception as e:
@@ -133,12 +236,12 @@ async def update_customer(customer_id: int, customer: Customer):
 async def delete_customer(customer_id: int):
     """Delete a customer"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("DELETE FROM customer WHERE customer_id = %s", (customer_id,))
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("DELETE FROM customer WHERE customer_id = %s", (customer_id,))
                 if cur.rowcount == 0:
                     raise HTTPException(status_code=404, detail="Customer not found")
-                conn.commit()
+                await conn.commit()
                 return {"status": 200, "message": "Customer deleted successfully"}
     except HTTPException:
         raise
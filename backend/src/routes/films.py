@@ -1,61 +1,117 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from src.schemas.film import Film
-from src.utils.database import db_connection
+import html
+from fastapi import APIRouter, HTTPException, Query, Request
+from psycopg.rows import dict_row
+from typing import List, Optional
+from src.schemas.film import Film, FilmSearchResult, MpaaRating
+from src.utils.batch import batch_get
+from src.utils.database import async_db_connection, execute_prepared, register_statement
+from src.utils.fields import Fields, sparse_get
+from src.utils.pagination import Keyset
+from src.utils.responses import list_response, model_response
 
 router = APIRouter()
 
+FILM_BY_ID = register_statement(
+    "film_by_id",
+    """SELECT film_id, title, description, release_year, language_id, original_language_id, 
+       rental_duration, rental_rate, length, replacement_cost, rating, last_update, 
+       special_features, fulltext FROM film WHERE film_id = %s"""
+)
+
+# Text search configuration used by film_fulltext_trigger to build film.fulltext
+SEARCH_CONFIG = "english"
+# ts_headline marks matches with these private-use characters (removed from the text first). The
+# snippet is HTML-escaped before they become <mark> tags, so film text can't inject markup.
+MATCH_START, MATCH_STOP = "\ue000", "\ue001"
+HEADLINE_OPTIONS = f"StartSel={MATCH_START}, StopSel={MATCH_STOP}, MaxWords=30, MinWords=10, MaxFragments=2"
+
+def headline_html(headline: str) -> str:
+    """A ts_headline snippet as HTML: escaped text with the matches in <mark>"""
+    return html.escape(headline).replace(MATCH_START, "<mark>").replace(MATCH_STOP, "</mark>")
+
 @router.get("/films", response_model=List[Film])
-async def get_films(limit: int = 100, offset: int = 0):
-    """Get all films with pagination"""
+async def get_films(request: Request,
+                    ids: Optional[str] = Query(None, description="Comma-separated ids to fetch instead of a page"),
+                    fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                    limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get all films with pagination, or the films with the given ids"""
+    if ids is not None:
+        return await batch_get(request, Film, "film", "film_id", ids, fields)
+    keyset = Keyset(("film_id",), after=after, before=before)
+    selected = Fields(Film, fields, always=keyset.columns)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """SELECT film_id, title, description, release_year, language_id, original_language_id, 
-                       rental_duration, rental_rate, length, replacement_cost, rating, last_update, 
-                       special_features, fulltext FROM film ORDER BY film_id LIMIT %s OFFSET %s""",
-                    (limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"SELECT {selected.columns} FROM film WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                    (*keyset.params, limit, keyset.offset(offset))
+                )
+                films = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, films, request)
+                keyset.set_link_header(request, response, films, limit, offset)
+                return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.get("/films/search", response_model=List[FilmSearchResult])
+async def search_films(request: Request, q: str = Query(..., min_length=1), rating: Optional[MpaaRating] = None,
+                       category_id: Optional[int] = None, language_id: Optional[int] = None,
+                       limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Full-text search over film titles and descriptions, best matches first"""
+    keyset = Keyset(("rank", "film_id"), (float, int), descending=True, after=after, before=before)
+    conditions, params = ["f.fulltext @@ query.q"], []
+    if rating is not None:
+        conditions.append("f.rating = %s")
+        params.append(rating.value)
+    if language_id is not None:
+        conditions.append("f.language_id = %s")
+        params.append(language_id)
+    if category_id is not None:
+        conditions.append("EXISTS (SELECT 1 FROM film_category fc WHERE fc.film_id = f.film_id AND fc.category_id = %s)")
+        params.append(category_id)
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                # Matching uses film_fulltext_idx; ts_headline only runs on the rows of the page
+                await cur.execute(
+                    f"""WITH query AS (SELECT websearch_to_tsquery(%s, %s) AS q)
+                        SELECT page.*, ts_headline(%s, translate(page.title || ': ' || coalesce(page.description, ''), %s, ''),
+                                                  query.q, %s) AS headline
+                        FROM (
+                            SELECT * FROM (
+                                SELECT f.film_id, f.title, f.description, f.release_year, f.language_id, f.rating,
+                                       f.length, f.rental_rate, ts_rank(f.fulltext, query.q)::float8 AS rank
+                                FROM film f, query WHERE {" AND ".join(conditions)}
+                            ) matches
+                            WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s
+                        ) page, query
+                        ORDER BY {keyset.order_by}""",
+                    (SEARCH_CONFIG, q, SEARCH_CONFIG, MATCH_START + MATCH_STOP, HEADLINE_OPTIONS, *params, *keyset.params, limit, keyset.offset(offset))
                 )
-                films = []
-                for row in cur.fetchall():
-                    films.append(Film(
-                        film_id=row[0],
-                        title=row[1],
-                        description=row[2],
-                        release_year=row[3],
-                        language_id=row[4],
-                        original_language_id=row[5],
-                        rental_duration=row[6],
-                        rental_rate=row[7],
-                        length=row[8],
-                        replacement_cost=row[9],
-                        rating=row[10],
-                        last_update=row[11],
-                        special_features=row[12],
-                        fulltext=row[13]
-                    ))
-                return films
+                films = keyset.page(await cur.fetchall())
+                for film in films:
+                    film["headline"] = headline_html(film["headline"])
+                response = list_response(FilmSearchResult, films, request)
+                keyset.set_link_header(request, response, films, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/films/{film_id}", response_model=Film)
-async def get_film(film_id: int):
+async def get_film(request: Request, film_id: int,
+                   fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all")):
     """Get a specific film by ID"""
+    if fields is not None:
+        return await sparse_get(request, Film, "film", "film_id", film_id, fields, "Film not found")
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """SELECT film_id, title, description, release_year, language_id, original_language_id, 
-                       rental_duration, rental_rate, length, replacement_cost, rating, last_update, 
-                       special_features, fulltext FROM film WHERE film_id = %s""",
-                    (film_id,)
-                )
-                row = cur.fetchone()
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute_prepared(cur, FILM_BY_ID, (film_id,))
+                row = await cur.fetchone()
                 if not row:
                     raise HTTPException(status_code=404, detail="Film not found")
                 
-                return Film(
+                film = Film(
                     film_id=row[0],
                     title=row[1],
                     description=row[2],
@@ -71,6 +127,7 @@ async def get_film(film_id: int):
                     special_features=row[12],
                     fulltext=row[13]
                 )
+                return model_response(request, film, film.last_update)
     except HTTPException:
         raise
     except Exception as e:
@@ -80,9 +137,9 @@ async def get_film(film_id: int):
 async def create_film(film: Film):
     """Create a new film"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """INSERT INTO film (title, description, release_year, language_id, original_language_id, 
                        rental_duration, rental_rate, length, replacement_cost, rating, last_update, 
                        special_features, fulltext) 
@@ -91,8 +148,8 @@ async def create_film(film: Film):
                      film.rental_duration, film.rental_rate, film.length, film.replacement_cost, film.rating,
                      film.last_update, film.special_features, film.fulltext)
                 )
-                film_id = cur.fetchone()[0]
-                conn.commit()
+                film_id = (await cur.fetchone())[0]
+                await conn.commit()
                 
                 return Film(
                     film_id=film_id,
@@ -117,9 +174,9 @@ async def create_film(film: Film):
 async def update_film(film_id: int, film: Film):
     """Update an existing film"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """UPDATE film SET title = %s, description = %s, release_year = %s, language_id = %s, 
                        original_language_id = %s, rental_duration = %s, rental_rate = %s, length = %s, 
                        replacement_cost = %s, rating = %s, last_update = %s, special_features = %s, 
@@ -130,7 +187,7 @@ async def update_film(film_id: int, film: Film):
                 )
                 if cur.rowcount == 0:
                     raise HTTPException(status_code=404, detail="Film not found")
-                conn.commit()
+                await conn.commit()
                 
                 return Film(
                     film_id=film_id,
@@ -157,12 +214,12 @@ async def update_film(film_id: int, film: Film):
 async def delete_film(film_id: int):
     """Delete a film"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("DELETE FROM film WHERE film_id = %s", (film_id,))
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("DELETE FROM film WHERE film_id = %s", (film_id,))
                 if cur.rowcount == 0:
                     raise HTTPException(status_code=404, detail="Film not found")
-                conn.commit()
+                await conn.commit()
                 return {"status": 200, "message": "Film deleted successfully"}
     except HTTPException:
         raise
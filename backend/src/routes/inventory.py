@@ -1,97 +1,203 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from src.schemas.inventory import Inventory
-from src.utils.database import db_connection
+from fastapi import APIRouter, HTTPException, Query, Request
+from psycopg.rows import dict_row
+from typing import List, Optional
+from src.schemas.bulk import BulkResponse
+from src.schemas.inventory import Inventory, InventoryBulkItem
+from src.utils.availability import invalidate_availability
+from src.utils.batch import batch_get
+from src.utils.bulk import bulk_response, bulk_upsert, parse_bulk_body, validate_bulk_items
+from src.utils.database import async_db_connection
+from src.utils.fields import Fields, sparse_get
+from src.utils.pagination import Keyset
+from src.utils.responses import list_response, model_response
 
 router = APIRouter()
 
 @router.get("/inventory", response_model=List[Inventory])
-async def get_inventory(limit: int = 100, offset: int = 0):
-    """Get all inventory items with pagination"""
+async def get_inventory(request: Request,
+                        ids: Optional[str] = Query(None, description="Comma-separated ids to fetch instead of a page"),
+                        fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                        limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get all inventory items with pagination, or the inventory items with the given ids"""
+    if ids is not None:
+        return await batch_get(request, Inventory, "inventory", "inventory_id", ids, fields)
+    keyset = Keyset(("inventory_id",), after=after, before=before)
+    selected = Fields(Inventory, fields, always=keyset.columns)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT inventory_id, film_id, store_id, last_update FROM inventory ORDER BY inventory_id LIMIT %s OFFSET %s",
-                    (limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"SELECT {selected.columns} FROM inventory WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                    (*keyset.params, limit, keyset.offset(offset))
                 )
-                inventory_items = []
-                for row in cur.fetchall():
-                    inventory_items.append(Inventory(
-                        inventory_id=row[0],
-                        film_id=row[1],
-                        store_id=row[2],
-                        last_update=row[3]
-                    ))
-                return inventory_items
+                inventory_items = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, inventory_items, request)
+                keyset.set_link_header(request, response, inventory_items, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/inventory/{inventory_id}", response_model=Inventory)
-async def get_inventory_item(inventory_id: int):
+async def get_inventory_item(request: Request, inventory_id: int,
+                             fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all")):
     """Get a specific inventory item by ID"""
+    if fields is not None:
+        return await sparse_get(request, Inventory, "inventory", "inventory_id", inventory_id, fields, "Inventory item not found")
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     "SELECT inventory_id, film_id, store_id, last_update FROM inventory WHERE inventory_id = %s",
                     (inventory_id,)
                 )
-                row = cur.fetchone()
+                row = await cur.fetchone()
                 if not row:
                     raise HTTPException(status_code=404, detail="Inventory item not found")
                 
-                return Inventory(
+                item = Inventory(
                     inventory_id=row[0],
                     film_id=row[1],
                     store_id=row[2],
                     last_update=row[3]
                 )
+                return model_response(request, item, item.last_update)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/inventory/film/{film_id}", response_model=List[Inventory])
-async def get_inventory_by_film(film_id: int, limit: int = 100, offset: int = 0):
+async def get_inventory_by_film(request: Request, film_id: int,
+                                fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                                limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
     """Get all inventory items for a specific film"""
+    keyset = Keyset(("inventory_id",), after=after, before=before)
+    selected = Fields(Inventory, fields, always=keyset.columns)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT inventory_id, film_id, store_id, last_update FROM inventory WHERE film_id = %s ORDER BY inventory_id LIMIT %s OFFSET %s",
-                    (film_id, limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"SELECT {selected.columns} FROM inventory WHERE film_id = %s AND {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                    (film_id, *keyset.params, limit, keyset.offset(offset))
                 )
-                inventory_items = []
-                for row in cur.fetchall():
-                    inventory_items.append(Inventory(
-                        inventory_id=row[0],
-                        film_id=row[1],
-                        store_id=row[2],
-                        last_update=row[3]
-                    ))
-                return inventory_items
+                inventory_items = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, inventory_items, request)
+                keyset.set_link_header(request, response, inventory_items, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/inventory/store/{store_id}", response_model=List[Inventory])
-async def get_inventory_by_store(store_id: int, limit: int = 100, offset: int = 0):
+async def get_inventory_by_store(request: Request, store_id: int,
+                                 fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                                 limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
     """Get all inventory items for a specific store"""
+    keyset = Keyset(("inventory_id",), after=after, before=before)
+    selected = Fields(Inventory, fields, always=keyset.columns)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT inventory_id, film_id, store_id, last_update FROM inventory WHERE store_id = %s ORDER BY inventory_id LIMIT %s OFFSET %s",
-                    (store_id, limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"SELECT {selected.columns} FROM inventory WHERE store_id = %s AND {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                    (store_id, *keyset.params, limit, keyset.offset(offset))
                 )
-                inventory_items = []
-                for row in cur.fetchall():
-                    inventory_items.append(Inventory(
-                        inventory_id=row[0],
-                        film_id=row[1],
-                        store_id=row[2],
-                        last_update=row[3]
-                    ))
-                return inventory_items
+                inventory_items = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, inventory_items, request)
+                keyset.set_link_header(request, response, inventory_items, limit, offset)
+                return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.post("/inventory/bulk", response_model=BulkResponse)
+async def bulk_upsert_inventory(request: Request):
+    """
+    Create or update many inventory items in one transaction.
+    Accepts a JSON array of inventory items, or NDJSON with Content-Type: application/x-ndjson.
+    Rows with an existing inventory_id are updated, the rest are inserted;
+    inventory_id may be omitted for new items.
+    """
+    items = parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    valid, errors = validate_bulk_items(items, InventoryBulkItem, "inventory_id")
+    try:
+        results = []
+        if valid:
+            async with async_db_connection() as conn:
+                async with conn.cursor() as cur:
+                    results = await bulk_upsert(
+                        cur, "inventory", "inventory_id", "inventory_inventory_id_seq",
+                        ("film_id", "store_id", "last_update"),
+                        ("inventory_id",), valid
+                    )
+                    await conn.commit()
+                    invalidate_availability()
+        return bulk_response(results, errors)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.post("/inventory", response_model=Inventory)
+async def create_inventory_item(item: Inventory):
+    """Create a new inventory item"""
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "INSERT INTO inventory (film_id, store_id, last_update) VALUES (%s, %s, %s) RETURNING inventory_id",
+                    (item.film_id, item.store_id, item.last_update)
+                )
+                inventory_id = (await cur.fetchone())[0]
+                await conn.commit()
+                invalidate_availability()
+                
+                return Inventory(
+                    inventory_id=inventory_id,
+                    film_id=item.film_id,
+                    store_id=item.store_id,
+                    last_update=item.last_update
+                )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.put("/inventory/{inventory_id}", response_model=Inventory)
+async def update_inventory_item(inventory_id: int, item: Inventory):
+    """Update an existing inventory item"""
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "UPDATE inventory SET film_id = %s, store_id = %s, last_update = %s WHERE inventory_id = %s",
+                    (item.film_id, item.store_id, item.last_update, inventory_id)
+                )
+                if cur.rowcount == 0:
+                    raise HTTPException(status_code=404, detail="Inventory item not found")
+                await conn.commit()
+                invalidate_availability()
+                
+                return Inventory(
+                    inventory_id=inventory_id,
+                    film_id=item.film_id,
+                    store_id=item.store_id,
+                    last_update=item.last_update
+                )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.delete("/inventory/{inventory_id}")
+async def delete_inventory_item(inventory_id: int):
+    """Delete an inventory item"""
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("DELETE FROM inventory WHERE inventory_id = %s", (inventory_id,))
+                if cur.rowcount == 0:
+                    raise HTTPException(status_code=404, detail="Inventory item not found")
+                await conn.commit()
+                invalidate_availability()
+                return {"status": 200, "message": "Inventory item deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -1,51 +1,138 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request
+from psycopg.rows import dict_row
+from typing import List, Optional
 from src.schemas.language import Language
-from src.utils.database import db_connection
+from src.utils.batch import batch_get
+from src.utils.cache import get_cache
+from src.utils.database import async_db_connection
+from src.utils.fields import Fields
+from src.utils.pagination import Keyset
+from src.utils.responses import json_response, list_json, list_response
 
 router = APIRouter()
+languages_cache = get_cache("languages")
 
 @router.get("/languages", response_model=List[Language])
-async def get_languages(limit: int = 100, offset: int = 0):
-    """Get all languages with pagination"""
-    try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT language_id, name, last_update FROM language ORDER BY language_id LIMIT %s OFFSET %s",
-                    (limit, offset)
-                )
-                languages = []
-                for row in cur.fetchall():
-                    languages.append(Language(
-                        language_id=row[0],
-                        name=row[1],
-                        last_update=row[2]
-                    ))
-                return languages
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+async def get_languages(request: Request,
+                        ids: Optional[str] = Query(None, description="Comma-separated ids to fetch instead of a page"),
+                        fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                        limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get all languages with pagination, or the languages with the given ids"""
+    if ids is not None:
+        return await batch_get(request, Language, "language", "language_id", ids, fields)
+    keyset = Keyset(("language_id",), after=after, before=before)
+    selected = Fields(Language, fields)
+    cache_key = ("list", limit, offset, after, before)
+    cached = languages_cache.get(cache_key)
+    if cached is None:
+        generation = languages_cache.generation()
+        try:
+            async with async_db_connection(cache_fill=True) as conn:
+                async with conn.cursor(row_factory=dict_row) as cur:
+                    await cur.execute(
+                        f"SELECT language_id, name, last_update FROM language WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                        (*keyset.params, limit, keyset.offset(offset))
+                    )
+                    languages = keyset.page(await cur.fetchall())
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        cached = languages_cache.set(cache_key, (languages, list_json(Language, languages)), if_generation=generation)
+    languages, body = cached
+    # The cache holds whole rows (a few small columns): fields only narrows the body
+    response = list_response(selected.model, languages, request) if selected.partial else json_response(body, request)
+    keyset.set_link_header(request, response, languages, limit, offset)
+    return response
 
 @router.get("/languages/{language_id}", response_model=Language)
-async def get_language(language_id: int):
+async def get_language(request: Request, language_id: int,
+                       fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all")):
     """Get a specific language by ID"""
+    selected = Fields(Language, fields)
+    language = languages_cache.get(("id", language_id))
+    if language is not None:
+        return selected.response(request, language)
+    generation = languages_cache.generation()
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection(cache_fill=True) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     "SELECT language_id, name, last_update FROM language WHERE language_id = %s",
                     (language_id,)
                 )
-                row = cur.fetchone()
+                row = await cur.fetchone()
                 if not row:
                     raise HTTPException(status_code=404, detail="Language not found")
                 
-                return Language(
+                return selected.response(request, languages_cache.set(("id", language_id), Language(
                     language_id=row[0],
                     name=row[1],
                     last_update=row[2]
+                ), if_generation=generation))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.post("/languages", response_model=Language)
+async def create_language(language: Language):
+    """Create a new language"""
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "INSERT INTO language (name, last_update) VALUES (%s, %s) RETURNING language_id",
+                    (language.name, language.last_update)
+                )
+                language_id = (await cur.fetchone())[0]
+                await conn.commit()
+                languages_cache.invalidate()
+                
+                return Language(
+                    language_id=language_id,
+                    name=language.name,
+                    last_update=language.last_update
+                )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.put("/languages/{language_id}", response_model=Language)
+async def update_language(language_id: int, language: Language):
+    """Update an existing language"""
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "UPDATE language SET name = %s, last_update = %s WHERE language_id = %s",
+                    (language.name, language.last_update, language_id)
+                )
+                if cur.rowcount == 0:
+                    raise HTTPException(status_code=404, detail="Language not found")
+                await conn.commit()
+                languages_cache.invalidate()
+                
+                return Language(
+                    language_id=language_id,
+                    name=language.name,
+                    last_update=language.last_update
                 )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.delete("/languages/{language_id}")
+async def delete_language(language_id: int):
+    """Delete a language"""
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("DELETE FROM language WHERE language_id = %s", (language_id,))
+                if cur.rowcount == 0:
+                    raise HTTPException(status_code=404, detail="Language not found")
+                await conn.commit()
+                languages_cache.invalidate()
+                return {"status": 200, "message": "Language deleted successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -1,51 +1,94 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from src.schemas.payment import Payment
-from src.utils.database import db_connection
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from psycopg.rows import dict_row
+from typing import List, Optional
+from src.schemas.bulk import BulkResponse
+from src.schemas.payment import Payment, PaymentBulkItem
+from src.utils.analytics import invalidate_revenue
+from src.utils.batch import batch_get
+from src.utils.bulk import bulk_response, bulk_upsert, parse_bulk_body, validate_bulk_items
+from src.utils.database import async_db_connection, execute_prepared, register_statement
+from src.utils.export import MEDIA_TYPES, ExportFormat, export_filename, stream_query
+from src.utils.fields import Fields, sparse_get
+from src.utils.pagination import Keyset
+from src.utils.params import date_range
+from src.utils.responses import list_response, model_response
+from src.utils.rewards import invalidate_rewards
 
 router = APIRouter()
 
+PAYMENT_BY_ID = register_statement(
+    "payment_by_id",
+    """SELECT payment_id, customer_id, staff_id, rental_id, amount, payment_date 
+       FROM payment WHERE payment_id = %s"""
+)
+
 @router.get("/payments", response_model=List[Payment])
-async def get_payments(limit: int = 100, offset: int = 0):
-    """Get all payments with pagination"""
+async def get_payments(request: Request,
+                       ids: Optional[str] = Query(None, description="Comma-separated ids to fetch instead of a page"),
+                       fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                       from_date: Optional[datetime] = Query(None, alias="from"),
+                       to_date: Optional[datetime] = Query(None, alias="to"),
+                       limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get all payments (optionally those made in [from, to)), newest first, with pagination, or the payments with the given ids"""
+    if ids is not None:
+        return await batch_get(request, Payment, "payment", "payment_id", ids, fields)
+    keyset = Keyset(("payment_date", "payment_id"), (datetime, int), descending=True, after=after, before=before)
+    selected = Fields(Payment, fields, always=keyset.columns)
+    period, period_params = date_range("payment_date", from_date, to_date)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """SELECT payment_id, customer_id, staff_id, rental_id, amount, payment_date 
-                       FROM payment ORDER BY payment_date DESC LIMIT %s OFFSET %s""",
-                    (limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"""SELECT {selected.columns} 
+                       FROM payment WHERE {period} AND {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s""",
+                    (*period_params, *keyset.params, limit, keyset.offset(offset))
                 )
-                payments = []
-                for row in cur.fetchall():
-                    payments.append(Payment(
-                        payment_id=row[0],
-                        customer_id=row[1],
-                        staff_id=row[2],
-                        rental_id=row[3],
-                        amount=row[4],
-                        payment_date=row[5]
-                    ))
-                return payments
+                payments = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, payments, request)
+                keyset.set_link_header(request, response, payments, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@router.get("/payments/export")
+async def export_payments(format: ExportFormat = ExportFormat.NDJSON,
+                          from_date: Optional[datetime] = Query(None, alias="from"),
+                          to_date: Optional[datetime] = Query(None, alias="to")):
+    """
+    Stream all payments (optionally those made in [from, to)) as NDJSON or CSV.
+    The bounds are plain comparisons on payment_date so Postgres only scans
+    the monthly partitions that overlap the range.
+    """
+    period, params = date_range("payment_date", from_date, to_date)
+    columns = ("payment_id", "customer_id", "staff_id", "rental_id", "amount", "payment_date")
+    return StreamingResponse(
+        stream_query(
+            "payment_export",
+            f"""SELECT {", ".join(columns)} FROM payment
+                WHERE {period} ORDER BY payment_date, payment_id""",
+            params, columns, format
+        ),
+        media_type=MEDIA_TYPES[format],
+        headers=export_filename("payments", format)
+    )
+
 @router.get("/payments/{payment_id}", response_model=Payment)
-async def get_payment(payment_id: int):
+async def get_payment(request: Request, payment_id: int,
+                      fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all")):
     """Get a specific payment by ID"""
+    if fields is not None:
+        return await sparse_get(request, Payment, "payment", "payment_id", payment_id, fields, "Payment not found")
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """SELECT payment_id, customer_id, staff_id, rental_id, amount, payment_date 
-                       FROM payment WHERE payment_id = %s""",
-                    (payment_id,)
-                )
-                row = cur.fetchone()
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute_prepared(cur, PAYMENT_BY_ID, (payment_id,))
+                row = await cur.fetchone()
                 if not row:
                     raise HTTPException(status_code=404, detail="Payment not found")
                 
-                return Payment(
+                payment = Payment(
                     payment_id=row[0],
                     customer_id=row[1],
                     staff_id=row[2],
@@ -53,58 +96,56 @@ async def get_payment(payment_id: int):
                     amount=row[4],
                     payment_date=row[5]
                 )
+                return model_response(request, payment, None)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/payments/customer/{customer_id}", response_model=List[Payment])
-async def get_payments_by_customer(customer_id: int, limit: int = 100, offset: int = 0):
-    """Get all payments for a specific customer"""
+async def get_payments_by_customer(request: Request, customer_id: int,
+                                   from_date: Optional[datetime] = Query(None, alias="from"),
+                                   to_date: Optional[datetime] = Query(None, alias="to"),
+                                   fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                                   limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get all payments for a specific customer (optionally those made in [from, to)), newest first"""
+    keyset = Keyset(("payment_date", "payment_id"), (datetime, int), descending=True, after=after, before=before)
+    selected = Fields(Payment, fields, always=keyset.columns)
+    period, period_params = date_range("payment_date", from_date, to_date)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """SELECT payment_id, customer_id, staff_id, rental_id, amount, payment_date 
-                       FROM payment WHERE customer_id = %s ORDER BY payment_date DESC LIMIT %s OFFSET %s""",
-                    (customer_id, limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"""SELECT {selected.columns} 
+                       FROM payment WHERE customer_id = %s AND {period} AND {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s""",
+                    (customer_id, *period_params, *keyset.params, limit, keyset.offset(offset))
                 )
-                payments = []
-                for row in cur.fetchall():
-                    payments.append(Payment(
-                        payment_id=row[0],
-                        customer_id=row[1],
-                        staff_id=row[2],
-                        rental_id=row[3],
-                        amount=row[4],
-                        payment_date=row[5]
-                    ))
-                return payments
+                payments = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, payments, request)
+                keyset.set_link_header(request, response, payments, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/payments/rental/{rental_id}", response_model=List[Payment])
-async def get_payments_by_rental(rental_id: int, limit: int = 100, offset: int = 0):
+async def get_payments_by_rental(request: Request, rental_id: int,
+                                 fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                                 limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
     """Get all payments for a specific rental"""
+    keyset = Keyset(("payment_date", "payment_id"), (datetime, int), after=after, before=before)
+    selected = Fields(Payment, fields, always=keyset.columns)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """SELECT payment_id, customer_id, staff_id, rental_id, amount, payment_date 
-                       FROM payment WHERE rental_id = %s ORDER BY payment_date LIMIT %s OFFSET %s""",
-                    (rental_id, limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"""SELECT {selected.columns} 
+                       FROM payment WHERE rental_id = %s AND {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s""",
+                    (rental_id, *keyset.params, limit, keyset.offset(offset))
                 )
-                payments = []
-                for row in cur.fetchall():
-                    payments.append(Payment(
-                        payment_id=row[0],
-                        customer_id=row[1],
-                        staff_id=row[2],
-                        rental_id=row[3],
-                        amount=row[4],
-                        payment_date=row[5]
-                    ))
-                return payments
+                payments = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, payments, request)
+                keyset.set_link_header(request, response, payments, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -112,15 +153,17 @@ async def get_payments_by_rental(rental_id: int, limit: int = 100, offset: int =
 async def create_payment(payment: Payment):
     """Create a new payment"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """INSERT INTO payment (customer_id, staff_id, rental_id, amount, payment_date) 
                        VALUES (%s, %s, %s, %s, %s) RETURNING payment_id""",
                     (payment.customer_id, payment.staff_id, payment.rental_id, payment.amount, payment.payment_date)
                 )
-                payment_id = cur.fetchone()[0]
-                conn.commit()
+                payment_id = (await cur.fetchone())[0]
+                await conn.commit()
+                invalidate_rewards([payment.payment_date])
+                invalidate_revenue([payment.payment_date])
                 
                 return Payment(
                     payment_id=payment_id,
@@ -133,13 +176,43 @@ async def create_payment(payment: Payment):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@router.post("/payments/bulk", response_model=BulkResponse)
+async def bulk_upsert_payments(request: Request):
+    """
+    Create or update many payments in one transaction.
+    Accepts a JSON array of payments, or NDJSON with Content-Type: application/x-ndjson.
+    Rows matching an existing (payment_id, payment_date) are updated, the rest are
+    inserted; payment_id may be omitted for new payments.
+    """
+    items = parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    valid, errors = validate_bulk_items(items, PaymentBulkItem, "payment_id")
+    try:
+        results = []
+        if valid:
+            async with async_db_connection() as conn:
+                async with conn.cursor() as cur:
+                    results = await bulk_upsert(
+                        cur, "payment", "payment_id", "payment_payment_id_seq",
+                        ("customer_id", "staff_id", "rental_id", "amount", "payment_date"),
+                        ("payment_id", "payment_date"), valid
+                    )
+                    await conn.commit()
+                payment_dates = [obj.payment_date for _, obj in valid]
+                invalidate_rewards(payment_dates)
+                invalidate_revenue(payment_dates)
+        return bulk_response(results, errors)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
 @router.put("/payments/{payment_id}", response_model=Payment)
 async def update_payment(payment_id: int, payment: Payment):
     """Update an existing payment"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """UPDATE payment SET customer_id = %s, staff_id = %s, rental_id = %s, 
                        amount = %s, payment_date = %s WHERE payment_id = %s""",
                     (payment.customer_id, payment.staff_id, payment.rental_id, payment.amount, 
@@ -147,7 +220,10 @@ async def update_payment(payment_id: int, payment: Payment):
                 )
                 if cur.rowcount == 0:
                     raise HTTPException(status_code=404, detail="Payment not found")
-                conn.commit()
+                await conn.commit()
+                # The payment may have moved out of another month
+                invalidate_rewards()
+                invalidate_revenue()
                 
                 return Payment(
                     payment_id=payment_id,
@@ -166,12 +242,16 @@ async def update_payment(payment_id: int, payment: Payment):
 async def delete_payment(payment_id: int):
     """Delete a payment"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("DELETE FROM payment WHERE payment_id = %s", (payment_id,))
-                if cur.rowcount == 0:
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("DELETE FROM payment WHERE payment_id = %s RETURNING payment_date", (payment_id,))
+                deleted = await cur.fetchall()
+                if not deleted:
                     raise HTTPException(status_code=404, detail="Payment not found")
-                conn.commit()
+                await conn.commit()
+                payment_dates = [payment_date for payment_date, in deleted]
+                invalidate_rewards(payment_dates)
+                invalidate_revenue(payment_dates)
                 return {"status": 200, "message": "Payment deleted successfully"}
     except HTTPException:
         raise
@@ -179,16 +259,19 @@ async def delete_payment(payment_id: int):
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/payments/customer/{customer_id}/total")
-async def get_customer_total_payments(customer_id: int):
-    """Get total amount paid by a customer"""
+async def get_customer_total_payments(customer_id: int,
+                                      from_date: Optional[datetime] = Query(None, alias="from"),
+                                      to_date: Optional[datetime] = Query(None, alias="to")):
+    """Get total amount paid by a customer (optionally in [from, to))"""
+    period, period_params = date_range("payment_date", from_date, to_date)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT COALESCE(SUM(amount), 0) FROM payment WHERE customer_id = %s",
-                    (customer_id,)
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    f"SELECT COALESCE(SUM(amount), 0) FROM payment WHERE customer_id = %s AND {period}",
+                    (customer_id, *period_params)
                 )
-                total = cur.fetchone()[0]
+                total = (await cur.fetchone())[0]
                 return {"customer_id": customer_id, "total_payments": float(total)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
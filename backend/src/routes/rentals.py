@@ -1,52 +1,86 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from psycopg.rows import dict_row
+from typing import List, Optional
+from src.schemas.bulk import BulkResponse
 from src.schemas.rental import Rental
-from src.utils.database import db_connection
+from src.utils.availability import invalidate_availability
+from src.utils.batch import batch_get
+from src.utils.bulk import bulk_response, bulk_upsert, parse_bulk_body, validate_bulk_items
+from src.utils.database import async_db_connection, execute_pipelined, execute_prepared, register_statement
+from src.utils.export import MEDIA_TYPES, ExportFormat, export_filename, stream_query
+from src.utils.fields import Fields, sparse_get
+from src.utils.pagination import Keyset
+from src.utils.params import date_range
+from src.utils.responses import list_response, model_response
 
 router = APIRouter()
 
+RENTAL_BY_ID = register_statement(
+    "rental_by_id",
+    """SELECT rental_id, rental_date, inventory_id, customer_id, return_date, staff_id, last_update 
+       FROM rental WHERE rental_id = %s"""
+)
+
 @router.get("/rentals", response_model=List[Rental])
-async def get_rentals(limit: int = 100, offset: int = 0):
-    """Get all rentals with pagination"""
+async def get_rentals(request: Request,
+                      ids: Optional[str] = Query(None, description="Comma-separated ids to fetch instead of a page"),
+                      fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                      limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get all rentals with pagination, or the rentals with the given ids"""
+    if ids is not None:
+        return await batch_get(request, Rental, "rental", "rental_id", ids, fields)
+    keyset = Keyset(("rental_id",), after=after, before=before)
+    selected = Fields(Rental, fields, always=keyset.columns)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """SELECT rental_id, rental_date, inventory_id, customer_id, return_date, staff_id, last_update 
-                       FROM rental ORDER BY rental_id LIMIT %s OFFSET %s""",
-                    (limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"""SELECT {selected.columns} 
+                       FROM rental WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s""",
+                    (*keyset.params, limit, keyset.offset(offset))
                 )
-                rentals = []
-                for row in cur.fetchall():
-                    rentals.append(Rental(
-                        rental_id=row[0],
-                        rental_date=row[1],
-                        inventory_id=row[2],
-                        customer_id=row[3],
-                        return_date=row[4],
-                        staff_id=row[5],
-                        last_update=row[6]
-                    ))
-                return rentals
+                rentals = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, rentals, request)
+                keyset.set_link_header(request, response, rentals, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@router.get("/rentals/export")
+async def export_rentals(format: ExportFormat = ExportFormat.NDJSON,
+                         from_date: Optional[datetime] = Query(None, alias="from"),
+                         to_date: Optional[datetime] = Query(None, alias="to")):
+    """Stream all rentals (optionally those rented in [from, to)) as NDJSON or CSV"""
+    period, params = date_range("rental_date", from_date, to_date)
+    columns = ("rental_id", "rental_date", "inventory_id", "customer_id", "return_date", "staff_id", "last_update")
+    return StreamingResponse(
+        stream_query(
+            "rental_export",
+            f"""SELECT {", ".join(columns)} FROM rental
+                WHERE {period} ORDER BY rental_id""",
+            params, columns, format
+        ),
+        media_type=MEDIA_TYPES[format],
+        headers=export_filename("rentals", format)
+    )
+
 @router.get("/rentals/{rental_id}", response_model=Rental)
-async def get_rental(rental_id: int):
+async def get_rental(request: Request, rental_id: int,
+                     fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all")):
     """Get a specific rental by ID"""
+    if fields is not None:
+        return await sparse_get(request, Rental, "rental", "rental_id", rental_id, fields, "Rental not found")
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """SELECT rental_id, rental_date, inventory_id, customer_id, return_date, staff_id, last_update 
-                       FROM rental WHERE rental_id = %s""",
-                    (rental_id,)
-                )
-                row = cur.fetchone()
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await execute_prepared(cur, RENTAL_BY_ID, (rental_id,))
+                row = await cur.fetchone()
                 if not row:
                     raise HTTPException(status_code=404, detail="Rental not found")
                 
-                return Rental(
+                rental = Rental(
                     rental_id=row[0],
                     rental_date=row[1],
                     inventory_id=row[2],
@@ -55,34 +89,31 @@ async def get_rental(rental_id: int):
                     staff_id=row[5],
                     last_update=row[6]
                 )
+                return model_response(request, rental, rental.last_update)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/rentals/customer/{customer_id}", response_model=List[Rental])
-async def get_rentals_by_customer(customer_id: int, limit: int = 100, offset: int = 0):
+async def get_rentals_by_customer(request: Request, customer_id: int,
+                                  fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                                  limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
     """Get all rentals for a specific customer"""
+    keyset = Keyset(("rental_date", "rental_id"), (datetime, int), descending=True, after=after, before=before)
+    selected = Fields(Rental, fields, always=keyset.columns)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """SELECT rental_id, rental_date, inventory_id, customer_id, return_date, staff_id, last_update 
-                       FROM rental WHERE customer_id = %s ORDER BY rental_date DESC LIMIT %s OFFSET %s""",
-                    (customer_id, limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"""SELECT {selected.columns} 
+                       FROM rental WHERE customer_id = %s AND {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s""",
+                    (customer_id, *keyset.params, limit, keyset.offset(offset))
                 )
-                rentals = []
-                for row in cur.fetchall():
-                    rentals.append(Rental(
-                        rental_id=row[0],
-                        rental_date=row[1],
-                        inventory_id=row[2],
-                        customer_id=row[3],
-                        return_date=row[4],
-                        staff_id=row[5],
-                        last_update=row[6]
-                    ))
-                return rentals
+                rentals = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, rentals, request)
+                keyset.set_link_header(request, response, rentals, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -90,16 +121,17 @@ async def get_rentals_by_customer(customer_id: int, limit: int = 100, offset: in
 async def create_rental(rental: Rental):
     """Create a new rental"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """INSERT INTO rental (rental_date, inventory_id, customer_id, return_date, staff_id, last_update) 
                        VALUES (%s, %s, %s, %s, %s, %s) RETURNING rental_id""",
                     (rental.rental_date, rental.inventory_id, rental.customer_id, rental.return_date, 
                      rental.staff_id, rental.last_update)
                 )
-                rental_id = cur.fetchone()[0]
-                conn.commit()
+                rental_id = (await cur.fetchone())[0]
+                await conn.commit()
+                invalidate_availability()
                 
                 return Rental(
                     rental_id=rental_id,
@@ -113,13 +145,40 @@ async def create_rental(rental: Rental):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@router.post("/rentals/bulk", response_model=BulkResponse)
+async def bulk_upsert_rentals(request: Request):
+    """
+    Create or update many rentals in one transaction.
+    Accepts a JSON array of rentals, or NDJSON with Content-Type: application/x-ndjson.
+    Rows with an existing rental_id are updated, the rest are inserted.
+    """
+    items = parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    valid, errors = validate_bulk_items(items, Rental, "rental_id")
+    try:
+        results = []
+        if valid:
+            async with async_db_connection() as conn:
+                async with conn.cursor() as cur:
+                    results = await bulk_upsert(
+                        cur, "rental", "rental_id", "rental_rental_id_seq",
+                        ("rental_date", "inventory_id", "customer_id", "return_date", "staff_id", "last_update"),
+                        ("rental_id",), valid
+                    )
+                    await conn.commit()
+                    invalidate_availability()
+        return bulk_response(results, errors)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
 @router.put("/rentals/{rental_id}", response_model=Rental)
 async def update_rental(rental_id: int, rental: Rental):
     """Update an existing rental"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """UPDATE rental SET rental_date = %s, inventory_id = %s, customer_id = %s, 
                        return_date = %s, staff_id = %s, last_update = %s WHERE rental_id = %s""",
                     (rental.rental_date, rental.inventory_id, rental.customer_id, rental.return_date,
@@ -127,7 +186,8 @@ async def update_rental(rental_id: int, rental: Rental):
                 )
                 if cur.rowcount == 0:
                     raise HTTPException(status_code=404, detail="Rental not found")
-                conn.commit()
+                await conn.commit()
+                invalidate_availability()
                 
                 return Rental(
                     rental_id=rental_id,
@@ -147,12 +207,13 @@ async def update_rental(rental_id: int, rental: Rental):
 async def delete_rental(rental_id: int):
     """Delete a rental"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("DELETE FROM rental WHERE rental_id = %s", (rental_id,))
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("DELETE FROM rental WHERE rental_id = %s", (rental_id,))
                 if cur.rowcount == 0:
                     raise HTTPException(status_code=404, detail="Rental not found")
-                conn.commit()
+                await conn.commit()
+                invalidate_availability()
                 return {"status": 200, "message": "Rental deleted successfully"}
     except HTTPException:
         raise
@@ -163,16 +224,16 @@ async def delete_rental(rental_id: int):
 async def return_rental(rental_id: int):
     """Mark a rental as returned (set return_date to current timestamp)"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "UPDATE rental SET return_date = NOW(), last_update = NOW() WHERE rental_id = %s AND return_date IS NULL",
-                    (rental_id,)
-                )
-                if cur.rowcount == 0:
-                    raise HTTPException(status_code=404, detail="Rental not found or already returned")
-                conn.commit()
-                return {"status": 200, "message": "Rental returned successfully"}
+        async with async_db_connection() as conn:
+            # Committed with the pipeline's sync: one round trip, no BEGIN or COMMIT
+            (returned,) = await execute_pipelined(conn, [(
+                "UPDATE rental SET return_date = NOW(), last_update = NOW() WHERE rental_id = %s AND return_date IS NULL",
+                (rental_id,)
+            )])
+            if returned.rowcount == 0:
+                raise HTTPException(status_code=404, detail="Rental not found or already returned")
+            invalidate_availability()
+            return {"status": 200, "message": "Rental returned successfully"}
     except HTTPException:
         raise
     except Exception as e:
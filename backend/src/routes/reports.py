@@ -0,0 +1,43 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from decimal import Decimal
+from psycopg.rows import dict_row
+from typing import List, Optional
+from src.schemas.customer import Customer
+from src.utils.database import async_db_connection
+from src.utils.export import MEDIA_TYPES, ExportFormat, iter_rows
+from src.utils.responses import json_response, list_json
+from src.utils.rewards import (
+    REWARD_COLUMNS, parse_rewards_month, rewards_cache, rewards_key, rewards_query
+)
+
+router = APIRouter()
+
+@router.get("/reports/rewards", response_model=List[Customer])
+async def get_rewards_report(request: Request, min_monthly_purchases: int, min_dollar_amount_purchased: Decimal,
+                             month: Optional[str] = Query(None, description="YYYY-MM, defaults to three months ago"),
+                             format: Optional[ExportFormat] = None):
+    """
+    Get the customers rewards_report() would reward for a month: more than
+    min_monthly_purchases payments totalling more than min_dollar_amount_purchased.
+    Results are cached per month and parameters until a payment in that month
+    changes. JSON by default, or streamed as NDJSON or CSV with `format`.
+    """
+    month_start = parse_rewards_month(month)
+    sql, params = rewards_query(month_start, min_monthly_purchases, min_dollar_amount_purchased)
+    key = rewards_key(month_start, min_monthly_purchases, min_dollar_amount_purchased)
+    cached = rewards_cache.get(key)
+    if cached is None:
+        generation = rewards_cache.generation()
+        try:
+            async with async_db_connection(cache_fill=True) as conn:
+                async with conn.cursor(row_factory=dict_row) as cur:
+                    await cur.execute(sql, params)
+                    rows = await cur.fetchall()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        cached = rewards_cache.set(key, (rows, list_json(Customer, rows)), if_generation=generation)
+    rows, body = cached
+    if format is None:
+        return json_response(body, request)
+    return StreamingResponse(iter_rows(rows, REWARD_COLUMNS, format), media_type=MEDIA_TYPES[format])
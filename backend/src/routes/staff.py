@@ -1,56 +1,58 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request
+from psycopg.rows import dict_row
+from typing import List, Optional
 from src.schemas.staff import Staff
-from src.utils.database import db_connection
+from src.utils.batch import batch_get
+from src.utils.database import async_db_connection
+from src.utils.fields import Fields, sparse_get
+from src.utils.pagination import Keyset
+from src.utils.responses import list_response, model_response
 
 router = APIRouter()
 
 @router.get("/staff", response_model=List[Staff])
-async def get_staff(limit: int = 100, offset: int = 0):
-    """Get all staff with pagination"""
+async def get_staff(request: Request,
+                    ids: Optional[str] = Query(None, description="Comma-separated ids to fetch instead of a page"),
+                    fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                    limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get all staff with pagination, or the staff with the given ids"""
+    if ids is not None:
+        return await batch_get(request, Staff, "staff", "staff_id", ids, fields)
+    keyset = Keyset(("staff_id",), after=after, before=before)
+    selected = Fields(Staff, fields, always=keyset.columns)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """SELECT staff_id, first_name, last_name, address_id, email, store_id, active, 
-                       username, password, last_update, picture FROM staff ORDER BY staff_id LIMIT %s OFFSET %s""",
-                    (limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"SELECT {selected.columns} FROM staff WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                    (*keyset.params, limit, keyset.offset(offset))
                 )
-                staff_list = []
-                for row in cur.fetchall():
-                    staff_list.append(Staff(
-                        staff_id=row[0],
-                        first_name=row[1],
-                        last_name=row[2],
-                        address_id=row[3],
-                        email=row[4],
-                        store_id=row[5],
-                        active=row[6],
-                        username=row[7],
-                        password=row[8],
-                        last_update=row[9],
-                        picture=row[10]
-                    ))
-                return staff_list
+                staff_list = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, staff_list, request)
+                keyset.set_link_header(request, response, staff_list, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/staff/{staff_id}", response_model=Staff)
-async def get_staff_member(staff_id: int):
+async def get_staff_member(request: Request, staff_id: int,
+                           fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all")):
     """Get a specific staff member by ID"""
+    if fields is not None:
+        return await sparse_get(request, Staff, "staff", "staff_id", staff_id, fields, "Staff member not found")
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """SELECT staff_id, first_name, last_name, address_id, email, store_id, active, 
                        username, password, last_update, picture FROM staff WHERE staff_id = %s""",
                     (staff_id,)
                 )
-                row = cur.fetchone()
+                row = await cur.fetchone()
                 if not row:
                     raise HTTPException(status_code=404, detail="Staff member not found")
                 
-                return Staff(
+                staff_member = Staff(
                     staff_id=row[0],
                     first_name=row[1],
                     last_name=row[2],
@@ -63,37 +65,29 @@ async def get_staff_member(staff_id: int):
                     last_update=row[9],
                     picture=row[10]
                 )
+                return model_response(request, staff_member, staff_member.last_update)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/staff/store/{store_id}", response_model=List[Staff])
-async def get_staff_by_store(store_id: int, limit: int = 100, offset: int = 0):
+async def get_staff_by_store(request: Request, store_id: int,
+                             fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                             limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
     """Get all staff for a specific store"""
+    keyset = Keyset(("staff_id",), after=after, before=before)
+    selected = Fields(Staff, fields, always=keyset.columns)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """SELECT staff_id, first_name, last_name, address_id, email, store_id, active, 
-                       username, password, last_update, picture FROM staff WHERE store_id = %s ORDER BY staff_id LIMIT %s OFFSET %s""",
-                    (store_id, limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"SELECT {selected.columns} FROM staff WHERE store_id = %s AND {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                    (store_id, *keyset.params, limit, keyset.offset(offset))
                 )
-                staff_list = []
-                for row in cur.fetchall():
-                    staff_list.append(Staff(
-                        staff_id=row[0],
-                        first_name=row[1],
-                        last_name=row[2],
-                        address_id=row[3],
-                        email=row[4],
-                        store_id=row[5],
-                        active=row[6],
-                        username=row[7],
-                        password=row[8],
-                        last_update=row[9],
-                        picture=row[10]
-                    ))
-                return staff_list
+                staff_list = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, staff_list, request)
+                keyset.set_link_header(request, response, staff_list, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -1,52 +1,63 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request
+from psycopg.rows import dict_row
+from typing import List, Optional
 from src.schemas.store import Store
-from src.utils.database import db_connection
+from src.utils.batch import batch_get
+from src.utils.database import async_db_connection
+from src.utils.fields import Fields, sparse_get
+from src.utils.pagination import Keyset
+from src.utils.responses import list_response, model_response
 
 router = APIRouter()
 
 @router.get("/stores", response_model=List[Store])
-async def get_stores(limit: int = 100, offset: int = 0):
-    """Get all stores with pagination"""
+async def get_stores(request: Request,
+                     ids: Optional[str] = Query(None, description="Comma-separated ids to fetch instead of a page"),
+                     fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                     limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get all stores with pagination, or the stores with the given ids"""
+    if ids is not None:
+        return await batch_get(request, Store, "store", "store_id", ids, fields)
+    keyset = Keyset(("store_id",), after=after, before=before)
+    selected = Fields(Store, fields, always=keyset.columns)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT store_id, manager_staff_id, address_id, last_update FROM store ORDER BY store_id LIMIT %s OFFSET %s",
-                    (limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"SELECT {selected.columns} FROM store WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                    (*keyset.params, limit, keyset.offset(offset))
                 )
-                stores = []
-                for row in cur.fetchall():
-                    stores.append(Store(
-                        store_id=row[0],
-                        manager_staff_id=row[1],
-                        address_id=row[2],
-                        last_update=row[3]
-                    ))
-                return stores
+                stores = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, stores, request)
+                keyset.set_link_header(request, response, stores, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/stores/{store_id}", response_model=Store)
-async def get_store(store_id: int):
+async def get_store(request: Request, store_id: int,
+                    fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all")):
     """Get a specific store by ID"""
+    if fields is not None:
+        return await sparse_get(request, Store, "store", "store_id", store_id, fields, "Store not found")
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with async_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     "SELECT store_id, manager_staff_id, address_id, last_update FROM store WHERE store_id = %s",
                     (store_id,)
                 )
-                row = cur.fetchone()
+                row = await cur.fetchone()
                 if not row:
                     raise HTTPException(status_code=404, detail="Store not found")
                 
-                return Store(
+                store = Store(
                     store_id=row[0],
                     manager_staff_id=row[1],
                     address_id=row[2],
                     last_update=row[3]
                 )
+                return model_response(request, store, store.last_update)
     except HTTPException:
         raise
     except Exception as e:
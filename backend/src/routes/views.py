@@ -1,173 +1,170 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request
+from decimal import Decimal
+from psycopg.rows import dict_row
+from typing import List, Optional
 from src.schemas.views import (
     ActorInfo, CustomerList, FilmList, NicerButSlowerFilmList, 
     SalesByFilmCategory, SalesByStore, StaffList
 )
-from src.utils.database import db_connection
+from src.utils.database import async_db_connection
+from src.utils.fields import Fields
+from src.utils.pagination import Keyset
+from src.utils.reports import refresh_reports, report_response
+from src.utils.responses import list_response
 
 router = APIRouter()
 
+# View columns whose name is not a valid field name
+EXPRESSIONS = {"zip_code": '"zip code" AS zip_code'}
+
 @router.get("/views/actor-info", response_model=List[ActorInfo])
-async def get_actor_info(limit: int = 100, offset: int = 0):
+async def get_actor_info(request: Request,
+                         fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                         limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
     """Get actor information view"""
+    keyset = Keyset(("actor_id",), after=after, before=before)
+    selected = Fields(ActorInfo, fields, always=keyset.columns)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT actor_id, first_name, last_name, film_info FROM actor_info ORDER BY actor_id LIMIT %s OFFSET %s",
-                    (limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"SELECT {selected.columns} FROM actor_info WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                    (*keyset.params, limit, keyset.offset(offset))
                 )
-                actors = []
-                for row in cur.fetchall():
-                    actors.append(ActorInfo(
-                        actor_id=row[0],
-                        first_name=row[1],
-                        last_name=row[2],
-                        film_info=row[3]
-                    ))
-                return actors
+                actors = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, actors, request)
+                keyset.set_link_header(request, response, actors, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/views/customer-list", response_model=List[CustomerList])
-async def get_customer_list(limit: int = 100, offset: int = 0):
+async def get_customer_list(request: Request,
+                            fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                            limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
     """Get customer list view"""
+    keyset = Keyset(("id",), after=after, before=before)
+    selected = Fields(CustomerList, fields, always=keyset.columns, expressions=EXPRESSIONS)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """SELECT id, name, address, "zip code", phone, city, country, notes, sid 
-                       FROM customer_list ORDER BY id LIMIT %s OFFSET %s""",
-                    (limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"""SELECT {selected.columns} 
+                       FROM customer_list WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s""",
+                    (*keyset.params, limit, keyset.offset(offset))
                 )
-                customers = []
-                for row in cur.fetchall():
-                    customers.append(CustomerList(
-                        id=row[0],
-                        name=row[1],
-                        address=row[2],
-                        zip_code=row[3],
-                        phone=row[4],
-                        city=row[5],
-                        country=row[6],
-                        notes=row[7],
-                        sid=row[8]
-                    ))
-                return customers
+                customers = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, customers, request)
+                keyset.set_link_header(request, response, customers, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-@router.get("/views/film-list", response_model=List[FilmList])
-async def get_film_list(limit: int = 100, offset: int = 0):
+@router.get("/views/film-list", response_model=List[FilmList], deprecated=True)
+async def get_film_list(request: Request,
+                        fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                        limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
     """Get film list view"""
+    keyset = Keyset(("fid",), after=after, before=before)
+    selected = Fields(FilmList, fields, always=keyset.columns)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT fid, title, description, category, price, length, rating, actors FROM film_list ORDER BY fid LIMIT %s OFFSET %s",
-                    (limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"SELECT {selected.columns} FROM film_list WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                    (*keyset.params, limit, keyset.offset(offset))
                 )
-                films = []
-                for row in cur.fetchall():
-                    films.append(FilmList(
-                        fid=row[0],
-                        title=row[1],
-                        description=row[2],
-                        category=row[3],
-                        price=row[4],
-                        length=row[5],
-                        rating=row[6],
-                        actors=row[7]
-                    ))
-                return films
+                films = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, films, request)
+                keyset.set_link_header(request, response, films, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-@router.get("/views/nicer-film-list", response_model=List[NicerButSlowerFilmList])
-async def get_nicer_film_list(limit: int = 100, offset: int = 0):
+@router.get("/views/nicer-film-list", response_model=List[NicerButSlowerFilmList], deprecated=True)
+async def get_nicer_film_list(request: Request,
+                              fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                              limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
     """Get nicer but slower film list view"""
+    keyset = Keyset(("fid",), after=after, before=before)
+    selected = Fields(NicerButSlowerFilmList, fields, always=keyset.columns)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT fid, title, description, category, price, length, rating, actors FROM nicer_but_slower_film_list ORDER BY fid LIMIT %s OFFSET %s",
-                    (limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"SELECT {selected.columns} FROM nicer_but_slower_film_list WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+                    (*keyset.params, limit, keyset.offset(offset))
                 )
-                films = []
-                for row in cur.fetchall():
-                    films.append(NicerButSlowerFilmList(
-                        fid=row[0],
-                        title=row[1],
-                        description=row[2],
-                        category=row[3],
-                        price=row[4],
-                        length=row[5],
-                        rating=row[6],
-                        actors=row[7]
-                    ))
-                return films
+                films = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, films, request)
+                keyset.set_link_header(request, response, films, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/views/sales-by-film-category", response_model=List[SalesByFilmCategory])
-async def get_sales_by_film_category(limit: int = 100, offset: int = 0):
-    """Get sales by film category view"""
+async def get_sales_by_film_category(request: Request, live: bool = False,
+                                     limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get sales by film category, from the materialized report unless live=true"""
+    keyset = Keyset(("total_sales", "category"), (Decimal, str), descending=True, after=after, before=before)
+    source = "sales_by_film_category" if live else "mv_sales_by_film_category"
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT category, total_sales FROM sales_by_film_category ORDER BY total_sales DESC LIMIT %s OFFSET %s", (limit, offset))
-                sales = []
-                for row in cur.fetchall():
-                    sales.append(SalesByFilmCategory(
-                        category=row[0],
-                        total_sales=row[1]
-                    ))
-                return sales
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(f"SELECT category, total_sales FROM {source} WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s", (*keyset.params, limit, keyset.offset(offset)))
+                sales = keyset.page(await cur.fetchall())
+            response = await report_response(conn, request, SalesByFilmCategory, sales, None if live else source)
+            keyset.set_link_header(request, response, sales, limit, offset)
+            return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/views/sales-by-store", response_model=List[SalesByStore])
-async def get_sales_by_store(limit: int = 100, offset: int = 0):
-    """Get sales by store view"""
+async def get_sales_by_store(request: Request, live: bool = False,
+                             limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
+    """Get sales by store, from the materialized report unless live=true"""
+    keyset = Keyset(("total_sales", "store_id"), (Decimal, int), descending=True, after=after, before=before)
+    source = "sales_by_store_keyed" if live else "mv_sales_by_store"
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(f"SELECT store_id, store, manager, total_sales FROM {source} WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s", (*keyset.params, limit, keyset.offset(offset)))
+                sales = keyset.page(await cur.fetchall())
+            response = await report_response(conn, request, SalesByStore, sales, None if live else source)
+            keyset.set_link_header(request, response, sales, limit, offset)
+            return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.post("/views/refresh")
+async def refresh_report_views():
+    """Refresh the materialized sales reports now"""
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT store, manager, total_sales FROM sales_by_store ORDER BY total_sales DESC LIMIT %s OFFSET %s", (limit, offset))
-                sales = []
-                for row in cur.fetchall():
-                    sales.append(SalesByStore(
-                        store=row[0],
-                        manager=row[1],
-                        total_sales=row[2]
-                    ))
-                return sales
+        refreshed_at = await refresh_reports()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if refreshed_at is None:
+        raise HTTPException(status_code=409, detail="A refresh is already running")
+    return {"status": 200, "message": "Reports refreshed", "refreshed_at": refreshed_at}
 
 @router.get("/views/staff-list", response_model=List[StaffList])
-async def get_staff_list(limit: int = 100, offset: int = 0):
+async def get_staff_list(request: Request,
+                         fields: Optional[str] = Query(None, description="Comma-separated fields to return instead of all"),
+                         limit: int = 100, offset: int = 0, after: Optional[str] = None, before: Optional[str] = None):
     """Get staff list view"""
+    keyset = Keyset(("id",), after=after, before=before)
+    selected = Fields(StaffList, fields, always=keyset.columns, expressions=EXPRESSIONS)
     try:
-        with db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """SELECT id, name, address, "zip code", phone, city, country, sid 
-                       FROM staff_list ORDER BY id LIMIT %s OFFSET %s""",
-                    (limit, offset)
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    f"""SELECT {selected.columns} 
+                       FROM staff_list WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s""",
+                    (*keyset.params, limit, keyset.offset(offset))
                 )
-                staff = []
-                for row in cur.fetchall():
-                    staff.append(StaffList(
-                        id=row[0],
-                        name=row[1],
-                        address=row[2],
-                        zip_code=row[3],
-                        phone=row[4],
-                        city=row[5],
-                        country=row[6],
-                        sid=row[7]
-                    ))
-                return staff
+                staff = keyset.page(await cur.fetchall())
+                response = list_response(selected.model, staff, request)
+                keyset.set_link_header(request, response, staff, limit, offset)
+                return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
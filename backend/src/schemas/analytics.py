@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+from decimal import Decimal
+
+class RevenuePoint(BaseModel):
+    bucket: datetime
+    group_id: Optional[int] = None
+    group_name: Optional[str] = None
+    payments: int
+    revenue: Decimal
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import List
+
+class FilmAvailability(BaseModel):
+    film_id: int
+    store_id: int
+    in_stock: bool
+    available: int
+    total: int
+    inventory_ids: List[int]
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class BulkResult(BaseModel):
+    row: int
+    status: str
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkResponse(BaseModel):
+    inserted: int
+    updated: int
+    failed: int
+    results: List[BulkResult]
@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+from .film import MpaaRating
+
+class FilmCatalog(BaseModel):
+    film_id: int
+    title: str
+    description: Optional[str] = None
+    category: Optional[str] = None
+    language: str
+    price: float
+    length: Optional[int] = None
+    rating: Optional[MpaaRating] = None
+    actors: List[str]
+    last_update: datetime
+
+    class Config:
+        from_attributes = True
@@ -28,3 +28,18 @@ class Film(BaseModel):
 
     class Config:
         from_attributes = True
+
+class FilmSearchResult(BaseModel):
+    film_id: int
+    title: str
+    description: Optional[str] = None
+    release_year: Optional[int] = None
+    language_id: int
+    rating: MpaaRating = MpaaRating.G
+    length: Optional[int] = None
+    rental_rate: float = 4.99
+    rank: float
+    headline: str
+
+    class Config:
+        from_attributes = True
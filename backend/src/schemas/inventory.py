@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Optional
 from datetime import datetime
 
 class Inventory(BaseModel):
@@ -9,3 +10,6 @@ class Inventory(BaseModel):
 
     class Config:
         from_attributes = True
+
+class InventoryBulkItem(Inventory):
+    inventory_id: Optional[int] = None
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Optional
 from datetime import datetime
 
 class Payment(BaseModel):
@@ -11,3 +12,6 @@ class Payment(BaseModel):
 
     class Config:
         from_attributes = True
+
+class PaymentBulkItem(Payment):
+    payment_id: Optional[int] = None
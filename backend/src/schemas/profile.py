@@ -0,0 +1,27 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from enum import Enum
+from .address import Address
+from .city import City
+from .country import Country
+from .customer import Customer
+from .payment import Payment
+from .rental import Rental
+
+class ProfileSection(str, Enum):
+    ADDRESS = "address"
+    RENTALS = "rentals"
+    PAYMENTS = "payments"
+    TOTAL = "total"
+
+class CustomerProfile(BaseModel):
+    customer: Customer
+    address: Optional[Address] = None
+    city: Optional[City] = None
+    country: Optional[Country] = None
+    rentals: Optional[List[Rental]] = None
+    payments: Optional[List[Payment]] = None
+    total_payments: Optional[float] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,144 @@
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Set
+
+from fastapi import HTTPException
+from psycopg import AsyncCursor
+
+from src.utils.cache import get_cache
+
+class RevenueBucket(str, Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+class RevenueGroup(str, Enum):
+    NONE = "none"
+    STORE = "store"
+    STAFF = "staff"
+    CATEGORY = "category"
+
+# Per grouping: the group id expression, the joins it needs from payment p,
+# and a query naming every group (attributed like sales_by_store and
+# sales_by_film_category: through the rented inventory)
+GROUPS = {
+    RevenueGroup.NONE: ("NULL::integer", "", None),
+    RevenueGroup.STORE: (
+        "i.store_id",
+        "JOIN rental r ON r.rental_id = p.rental_id JOIN inventory i ON i.inventory_id = r.inventory_id",
+        """SELECT s.store_id AS group_id, c.city || ',' || cy.country AS group_name FROM store s
+           JOIN address a ON a.address_id = s.address_id JOIN city c ON c.city_id = a.city_id
+           JOIN country cy ON cy.country_id = c.country_id"""
+    ),
+    RevenueGroup.STAFF: ("p.staff_id", "", "SELECT staff_id AS group_id, first_name || ' ' || last_name AS group_name FROM staff"),
+    RevenueGroup.CATEGORY: (
+        "fc.category_id",
+        """JOIN rental r ON r.rental_id = p.rental_id JOIN inventory i ON i.inventory_id = r.inventory_id
+           JOIN film_category fc ON fc.film_id = i.film_id""",
+        "SELECT category_id AS group_id, name AS group_name FROM category"
+    ),
+}
+
+# Closed months only change through payment writes, which invalidate them
+revenue_cache = get_cache("revenue", ttl=float(os.getenv("REVENUE_CACHE_TTL", 86400)), max_entries=4096)
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def parse_month(value: Optional[str], name: str) -> Optional[date]:
+    """First day of a YYYY-MM month parameter"""
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be formatted as YYYY-MM")
+
+def payment_months(payment_dates: Iterable[datetime]) -> Set[date]:
+    """
+    Months the given payments may be counted in. A day either side is
+    included so a payment near midnight at the end of a month covers both
+    months whatever the database session's time zone.
+    """
+    return {
+        month_start(day)
+        for payment_date in payment_dates
+        for day in (payment_date - timedelta(days=1), payment_date, payment_date + timedelta(days=1))
+    }
+
+async def revenue(cur: AsyncCursor, bucket: RevenueBucket, group_by: RevenueGroup,
+                  first_month: date, last_month: date) -> List[dict]:
+    """
+    Revenue and payment count per bucket and group for the months
+    [first_month, last_month], oldest bucket first.
+
+    Aggregates are cached per calendar month: a closed month is computed once
+    and then served from revenue_cache, while the open month (and any later
+    one) is aggregated again on every call, so the cost of a request does
+    not grow with the history it covers. Months missing from the cache are
+    aggregated in one date_trunc query over their payment_date range, which
+    only scans their partitions, and are cached unless a payment write
+    invalidated revenue_cache while it ran. Weeks straddling two months are cached as
+    two partial rows and added up here.
+    """
+    group_id, joins, names_sql = GROUPS[group_by]
+    open_month = month_start(datetime.now(timezone.utc).date())
+    months, month = [], first_month
+    while month <= last_month:
+        months.append(month)
+        month = next_month(month)
+
+    per_month: Dict[date, List[dict]] = {}
+    for month in months:
+        cached = revenue_cache.get((month, bucket, group_by)) if month < open_month else None
+        if cached is not None:
+            per_month[month] = cached
+    missing = [month for month in months if month not in per_month]
+    if missing:
+        generation = revenue_cache.generation()
+        await cur.execute(
+            f"""SELECT date_trunc('month', p.payment_date)::date AS month,
+                       date_trunc(%s, p.payment_date) AS bucket, {group_id} AS group_id,
+                       count(*) AS payments, sum(p.amount) AS revenue
+                FROM payment p {joins}
+                WHERE p.payment_date >= %s AND p.payment_date < %s
+                GROUP BY 1, 2, 3""",
+            (bucket.value, missing[0], next_month(missing[-1]))
+        )
+        fetched = defaultdict(list)
+        for row in await cur.fetchall():
+            fetched[row["month"]].append(row)
+        for month in missing:
+            per_month[month] = fetched[month]
+            if month < open_month:
+                revenue_cache.set((month, bucket, group_by), fetched[month], if_generation=generation)
+
+    totals = {}
+    for month in months:
+        for row in per_month[month]:
+            total = totals.setdefault((row["bucket"], row["group_id"]), {"payments": 0, "revenue": 0})
+            total["payments"] += row["payments"]
+            total["revenue"] += row["revenue"]
+    names = {}
+    if names_sql:
+        await cur.execute(names_sql)
+        names = {row["group_id"]: row["group_name"] for row in await cur.fetchall()}
+    return [
+        {"bucket": bucket_start, "group_id": group, "group_name": names.get(group),
+         "payments": total["payments"], "revenue": total["revenue"]}
+        for (bucket_start, group), total in sorted(totals.items(), key=lambda item: (item[0][0], item[0][1] or 0))
+    ]
+
+def invalidate_revenue(payment_dates: Optional[Iterable[datetime]] = None):
+    """Drop the cached revenue of the months the given payments fall in, or of every month"""
+    if payment_dates is None:
+        revenue_cache.invalidate()
+        return
+    months = payment_months(payment_dates)
+    if months:
+        revenue_cache.invalidate_matching(lambda key: key[0] in months)
@@ -0,0 +1,67 @@
+import os
+from typing import Dict, List, Sequence
+
+from psycopg import AsyncCursor
+from psycopg.rows import dict_row
+
+from src.utils.cache import get_cache
+from src.utils.params import parse_id_list
+
+# Most films one availability request may ask for
+MAX_AVAILABILITY_FILMS = 1000
+
+# Availability is cached per (store_id, film_id) for a few seconds; 0 disables the cache
+availability_cache = get_cache(
+    "availability",
+    ttl=float(os.getenv("AVAILABILITY_CACHE_TTL", 5)),
+    max_entries=int(os.getenv("AVAILABILITY_CACHE_MAX_ENTRIES", 20000))
+)
+
+def parse_film_ids(film_ids: str) -> List[int]:
+    """Parse the comma-separated film_ids parameter"""
+    return parse_id_list(film_ids, "film_ids", MAX_AVAILABILITY_FILMS)
+
+async def fetch_availability(cur: AsyncCursor, store_id: int, film_ids: Sequence[int]) -> List[Dict]:
+    """
+    Stock of many films at one store in a single query.
+
+    A set-based version of film_in_stock(): an inventory item is in stock
+    when no rental of it is still open (return_date IS NULL), the same test
+    inventory_in_stock() makes per item. Items are found through the
+    idx_store_id_film_id index and open rentals through idx_fk_inventory_id.
+    Rows come back in the order of `film_ids`, including films without stock.
+    """
+    cur.row_factory = dict_row
+    await cur.execute(
+        """SELECT f.film_id, %s AS store_id,
+                  count(i.inventory_id) FILTER (WHERE i.in_stock) > 0 AS in_stock,
+                  count(i.inventory_id) FILTER (WHERE i.in_stock) AS available,
+                  count(i.inventory_id) AS total,
+                  coalesce(array_agg(i.inventory_id ORDER BY i.inventory_id) FILTER (WHERE i.in_stock), '{}') AS inventory_ids
+           FROM unnest(%s::integer[]) WITH ORDINALITY AS f(film_id, position)
+           LEFT JOIN LATERAL (
+               SELECT inv.inventory_id, NOT EXISTS (
+                   SELECT 1 FROM rental r WHERE r.inventory_id = inv.inventory_id AND r.return_date IS NULL
+               ) AS in_stock
+               FROM inventory inv WHERE inv.store_id = %s AND inv.film_id = f.film_id
+           ) i ON true
+           GROUP BY f.film_id, f.position
+           ORDER BY f.position""",
+        (store_id, list(film_ids), store_id)
+    )
+    return await cur.fetchall()
+
+def cached_availability(store_id: int, film_ids: Sequence[int]) -> Dict[int, Dict]:
+    """Cached availability rows for the films that have one, keyed by film_id"""
+    if availability_cache.ttl <= 0:
+        return {}
+    cached = {}
+    for film_id in film_ids:
+        row = availability_cache.get((store_id, film_id))
+        if row is not None:
+            cached[film_id] = row
+    return cached
+
+def invalidate_availability():
+    """Drop cached availability; called by every handler that writes rentals"""
+    availability_cache.invalidate()
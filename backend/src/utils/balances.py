@@ -0,0 +1,60 @@
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+# Largest customer_ids list a balances request may pass
+MAX_BALANCE_CUSTOMERS = 10000
+
+BALANCE_COLUMNS = [
+    "customer_id", "first_name", "last_name", "email", "active",
+    "rental_fees", "late_fees", "payments", "balance"
+]
+
+def balances_query(as_of: datetime, customer_ids: Optional[Sequence[int]] = None,
+                   active: Optional[bool] = None) -> Tuple[str, List[Any]]:
+    """
+    SQL and parameters computing get_customer_balance(customer_id, as_of) for
+    many customers at once (all of them when customer_ids is None).
+
+    Instead of three lookups per customer, rental fees and late days are
+    aggregated over rental/inventory/film and payments over payment once,
+    grouped by customer, then joined to customer. The rules match the
+    function in data/migrations/004_fix_get_customer_balance.sql.
+    """
+    rental_filter, payment_filter, id_params = "", "", []
+    if customer_ids is not None:
+        rental_filter = "AND r.customer_id = ANY(%s)"
+        payment_filter = "AND customer_id = ANY(%s)"
+        id_params = [list(customer_ids)]
+    conditions, params = ["TRUE"], []
+    if customer_ids is not None:
+        conditions.append("c.customer_id = ANY(%s)")
+        params.append(list(customer_ids))
+    if active is not None:
+        conditions.append("c.activebool = %s")
+        params.append(active)
+    sql = f"""WITH fees AS (
+                  SELECT r.customer_id,
+                         sum(f.rental_rate) AS rental_fees,
+                         sum(GREATEST((r.return_date::date - r.rental_date::date) - f.rental_duration, 0)) AS late_fees
+                  FROM rental r
+                  JOIN inventory i ON i.inventory_id = r.inventory_id
+                  JOIN film f ON f.film_id = i.film_id
+                  WHERE r.rental_date <= %s {rental_filter}
+                  GROUP BY r.customer_id
+              ), paid AS (
+                  SELECT customer_id, sum(amount) AS payments
+                  FROM payment
+                  WHERE payment_date <= %s {payment_filter}
+                  GROUP BY customer_id
+              )
+              SELECT c.customer_id, c.first_name, c.last_name, c.email, c.activebool AS active,
+                     coalesce(fees.rental_fees, 0) AS rental_fees,
+                     coalesce(fees.late_fees, 0) AS late_fees,
+                     coalesce(paid.payments, 0) AS payments,
+                     coalesce(fees.rental_fees, 0) + coalesce(fees.late_fees, 0) - coalesce(paid.payments, 0) AS balance
+              FROM customer c
+              LEFT JOIN fees ON fees.customer_id = c.customer_id
+              LEFT JOIN paid ON paid.customer_id = c.customer_id
+              WHERE {" AND ".join(conditions)}
+              ORDER BY c.customer_id"""
+    return sql, [as_of, *id_params, as_of, *id_params, *params]
@@ -0,0 +1,45 @@
+from typing import Optional, Type
+
+from fastapi import HTTPException, Request, Response
+from psycopg import sql
+from psycopg.rows import dict_row
+from pydantic import BaseModel
+
+from src.utils.database import async_db_connection
+from src.utils.fields import Fields
+from src.utils.params import parse_id_list
+from src.utils.responses import list_response
+
+# Largest ids list a batch GET may pass
+MAX_BATCH_IDS = 1000
+
+async def batch_get(request: Request, model: Type[BaseModel], table: str, key: str, ids: str,
+                    fields: Optional[str] = None) -> Response:
+    """
+    Rows of `table` whose `key` is one of the comma-separated `ids`, fetched
+    with a single `WHERE key = ANY(%s)` and returned in the order the ids
+    were given. Ids without a row are listed in an X-Missing-Ids header.
+    The model's fields (or those in `fields`, see Fields) are the selected columns.
+
+    Usage, at the top of a list handler taking `ids: Optional[str] = None`:
+        if ids is not None:
+            return await batch_get(request, Film, "film", "film_id", ids, fields)
+    """
+    id_list = parse_id_list(ids, "ids", MAX_BATCH_IDS)
+    selected = Fields(model, fields, always=(key,))
+    query = sql.SQL("SELECT {columns} FROM {table} WHERE {key} = ANY(%s)").format(
+        columns=sql.SQL(", ").join(map(sql.Identifier, selected.selected)),
+        table=sql.Identifier(table), key=sql.Identifier(key)
+    )
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (id_list,))
+                rows = {row[key]: row for row in await cur.fetchall()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    response = list_response(selected.model, [rows[id] for id in id_list if id in rows], request)
+    missing = [str(id) for id in id_list if id not in rows]
+    if missing:
+        response.headers["X-Missing-Ids"] = ",".join(missing)
+    return response
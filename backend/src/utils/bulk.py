@@ -0,0 +1,194 @@
+import json
+import re
+from typing import Any, Dict, List, Sequence, Tuple, Type
+
+from fastapi import HTTPException
+from psycopg import AsyncCursor, errors, sql
+from pydantic import BaseModel, ValidationError
+
+from src.schemas.bulk import BulkResponse, BulkResult
+
+# Largest batch accepted by a bulk endpoint
+MAX_BULK_ROWS = 50000
+
+def parse_bulk_body(body: bytes, content_type: str) -> List[Any]:
+    """
+    Parse a bulk request body: a JSON array, or NDJSON (one object per line)
+    when the content type is application/x-ndjson.
+    """
+    try:
+        if content_type.split(";")[0].strip() in ("application/x-ndjson", "application/jsonlines"):
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid bulk body: {str(e)}")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Bulk body must be a JSON array or NDJSON")
+    if len(items) > MAX_BULK_ROWS:
+        raise HTTPException(status_code=413, detail=f"Bulk requests are limited to {MAX_BULK_ROWS} rows")
+    return items
+
+def validate_bulk_items(items: List[Any], model: Type[BaseModel], key: str) -> Tuple[List[Tuple[int, BaseModel]], Dict[int, BulkResult]]:
+    """
+    Validate every item against the model. Returns the valid (row, model)
+    pairs and error results for invalid rows and for rows repeating a key
+    already used by an earlier row of the batch.
+    """
+    valid, errors, seen = [], {}, set()
+    for row, item in enumerate(items):
+        try:
+            obj = model.model_validate(item)
+        except ValidationError as e:
+            errors[row] = BulkResult(row=row, status="error", error="; ".join(
+                f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+            ))
+            continue
+        key_value = getattr(obj, key)
+        if key_value is not None:
+            if key_value in seen:
+                errors[row] = BulkResult(row=row, status="error", id=key_value, error=f"Duplicate {key} in batch")
+                continue
+            seen.add(key_value)
+        valid.append((row, obj))
+    return valid, errors
+
+def _rejected(status_code: int, row: int, key_value: Any, error: str) -> HTTPException:
+    """A 4xx for the whole batch naming the row that caused it, in the shape of a bulk result"""
+    return HTTPException(
+        status_code=status_code,
+        detail=BulkResult(row=row, status="error", id=key_value, error=error).model_dump(exclude_none=True)
+    )
+
+async def _check_staged(cur: AsyncCursor, table: str, staging: sql.Identifier, key: str,
+                        conflict: Sequence[str]) -> None:
+    """
+    Reject the batch before the merge when a staged row would break it:
+    a key that already exists under other `conflict` values (the merge
+    would insert a second row with the same key), or a foreign key value
+    without a referenced row. Constraints of partitions count as well.
+    """
+    others = [c for c in conflict if c != key]
+    if others:
+        await cur.execute(sql.SQL(
+            """SELECT s.row_num, s.{key} FROM {staging} s JOIN {table} t ON t.{key} = s.{key}
+               WHERE NOT ({matches}) ORDER BY s.row_num LIMIT 1"""
+        ).format(
+            key=sql.Identifier(key), staging=staging, table=sql.Identifier(table),
+            matches=sql.SQL(" AND ").join(
+                sql.SQL("t.{} = s.{}").format(sql.Identifier(c), sql.Identifier(c)) for c in others
+            )
+        ))
+        clash = await cur.fetchone()
+        if clash:
+            raise _rejected(409, clash[0], clash[1], f"{key} {clash[1]} already exists with another {', '.join(others)}")
+
+    await cur.execute(
+        """SELECT DISTINCT referenced, fk_columns, referenced_columns FROM (
+               SELECT c.confrelid::regclass::text AS referenced,
+                      array_agg(a.attname::text ORDER BY k.n) AS fk_columns,
+                      array_agg(ra.attname::text ORDER BY k.n) AS referenced_columns
+               FROM pg_constraint c
+               CROSS JOIN LATERAL unnest(c.conkey, c.confkey) WITH ORDINALITY AS k(col, ref_col, n)
+               JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.col
+               JOIN pg_attribute ra ON ra.attrelid = c.confrelid AND ra.attnum = k.ref_col
+               WHERE c.contype = 'f'
+                 AND (c.conrelid = %s::regclass OR c.conrelid IN (SELECT relid FROM pg_partition_tree(%s::regclass)))
+               GROUP BY c.oid, c.confrelid
+           ) fk""",
+        (table, table)
+    )
+    for referenced, fk_columns, referenced_columns in await cur.fetchall():
+        await cur.execute(sql.SQL(
+            """SELECT s.row_num, s.{key}, {values} FROM {staging} s
+               WHERE {not_null} AND NOT EXISTS (SELECT 1 FROM {referenced} r WHERE {matches})
+               ORDER BY s.row_num LIMIT 1"""
+        ).format(
+            key=sql.Identifier(key), staging=staging, referenced=sql.SQL(referenced),
+            values=sql.SQL(", ").join(sql.SQL("s.{}").format(sql.Identifier(c)) for c in fk_columns),
+            not_null=sql.SQL(" AND ").join(sql.SQL("s.{} IS NOT NULL").format(sql.Identifier(c)) for c in fk_columns),
+            matches=sql.SQL(" AND ").join(
+                sql.SQL("r.{} = s.{}").format(sql.Identifier(rc), sql.Identifier(c))
+                for c, rc in zip(fk_columns, referenced_columns)
+            )
+        ))
+        missing = await cur.fetchone()
+        if missing:
+            values = ", ".join(f"{c}={v}" for c, v in zip(fk_columns, missing[2:]))
+            raise _rejected(422, missing[0], missing[1], f"{values} does not exist in {referenced}")
+
+async def bulk_upsert(cur: AsyncCursor, table: str, key: str, sequence: str, columns: Sequence[str],
+                      conflict: Sequence[str], items: List[Tuple[int, BaseModel]]) -> List[BulkResult]:
+    """
+    Load rows into a staging table with COPY and merge them with INSERT ... ON CONFLICT.
+
+    Rows without a key get one from the table's sequence first; rows whose
+    `conflict` columns match an existing row update it. The caller commits.
+    Returns one result per row in `items`, in row order. A row the database
+    would refuse fails the batch with a 4xx naming it (see _check_staged).
+    """
+    missing = [row for row, obj in items if getattr(obj, key) is None]
+    new_ids = {}
+    if missing:
+        await cur.execute("SELECT nextval(%s) FROM generate_series(1, %s)", (sequence, len(missing)))
+        new_ids = dict(zip(missing, (r[0] for r in await cur.fetchall())))
+
+    staging = sql.Identifier(f"{table}_staging")
+    all_columns = [key, *columns]
+    column_list = sql.SQL(", ").join(map(sql.Identifier, all_columns))
+    await cur.execute(sql.SQL("CREATE TEMP TABLE {} (row_num integer, LIKE {}) ON COMMIT DROP").format(
+        staging, sql.Identifier(table)
+    ))
+    staged = []
+    try:
+        async with cur.copy(sql.SQL("COPY {} (row_num, {}) FROM STDIN").format(staging, column_list)) as copy:
+            for row, obj in items:
+                key_value = getattr(obj, key)
+                staged.append((row, new_ids[row] if key_value is None else key_value))
+                await copy.write_row((*staged[-1], *(getattr(obj, c) for c in columns)))
+    except (errors.DataError, errors.IntegrityError) as e:
+        # COPY reports the failing input line, 1-based in write order
+        line = re.search(r"\bline (\d+)", e.diag.context or "")
+        if not line:
+            raise HTTPException(status_code=422, detail=f"Bulk row rejected: {e.diag.message_primary}")
+        row, key_value = staged[int(line.group(1)) - 1]
+        raise _rejected(422, row, key_value, e.diag.message_primary)
+    await _check_staged(cur, table, staging, key, conflict)
+
+    updates = sql.SQL(", ").join(
+        sql.SQL("{} = EXCLUDED.{}").format(sql.Identifier(c), sql.Identifier(c))
+        for c in all_columns if c not in conflict
+    )
+    # Rows that already exist are found in the statement's snapshot, i.e. before the insert
+    await cur.execute(sql.SQL(
+        """WITH existing AS (
+               SELECT s.row_num FROM {staging} s JOIN {table} t ON {matches}
+           ), merged AS (
+               INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging}
+               ON CONFLICT ({conflict}) DO UPDATE SET {updates}
+               RETURNING {key}
+           )
+           SELECT s.row_num, m.{key}, e.row_num IS NULL AS inserted
+           FROM merged m JOIN {staging} s USING ({key}) LEFT JOIN existing e USING (row_num)
+           ORDER BY s.row_num"""
+    ).format(
+        table=sql.Identifier(table), columns=column_list, staging=staging,
+        matches=sql.SQL(" AND ").join(
+            sql.SQL("t.{} = s.{}").format(sql.Identifier(c), sql.Identifier(c)) for c in conflict
+        ),
+        conflict=sql.SQL(", ").join(map(sql.Identifier, conflict)), updates=updates, key=sql.Identifier(key)
+    ))
+    return [
+        BulkResult(row=row, status="inserted" if inserted else "updated", id=key_value)
+        for row, key_value, inserted in await cur.fetchall()
+    ]
+
+def bulk_response(results: List[BulkResult], errors: Dict[int, BulkResult]) -> BulkResponse:
+    """Combine merge results and row errors into the response, in request order"""
+    combined = sorted([*results, *errors.values()], key=lambda r: r.row)
+    return BulkResponse(
+        inserted=sum(1 for r in combined if r.status == "inserted"),
+        updated=sum(1 for r in combined if r.status == "updated"),
+        failed=sum(1 for r in combined if r.status == "error"),
+        results=combined
+    )
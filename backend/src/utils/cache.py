@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Default TTL in seconds per reference entity, overridable with CACHE_TTL_<ENTITY>
+REFERENCE_TTLS = {
+    "languages": 3600,
+    "categories": 3600,
+    "countries": 3600,
+    "cities": 600,
+}
+DEFAULT_TTL = 300
+DEFAULT_MAX_ENTRIES = 256
+
+class TTLCache:
+    """
+    Bounded in-process cache: entries expire `ttl` seconds after they were
+    stored and the least recently used entry is evicted past `max_entries`.
+
+    The cache lives in the worker process, so each worker holds its own copy;
+    handlers that change the underlying table call `invalidate()`. A fill
+    reads `generation()` before its query and passes it to `set()`, so a
+    result that an invalidation overtook is returned but not stored. A ttl
+    of 0 disables the cache.
+
+    Usage:
+        languages_cache = get_cache("languages")
+        languages = languages_cache.get(key)
+        if languages is None:
+            generation = languages_cache.generation()
+            languages = languages_cache.set(key, await load_languages(), if_generation=generation)
+    """
+
+    def __init__(self, name: str, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or `default` if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self) -> int:
+        """Invalidation counter: changes whenever entries are invalidated"""
+        return self.invalidations
+
+    def set(self, key: Hashable, value: Any, if_generation: Optional[int] = None) -> Any:
+        """
+        Store a value for key and return it. With `if_generation`, the value
+        is only stored if nothing was invalidated since that generation().
+        """
+        with self._lock:
+            if self.ttl <= 0 or (if_generation is not None and if_generation != self.invalidations):
+                return value
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one key, or every entry when no key is given"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self.invalidations += 1
+
+    def invalidate_matching(self, predicate: Callable[[Hashable], bool]):
+        """Drop every entry whose key satisfies the predicate"""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Hit/miss counters and size of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "ttl": self.ttl,
+            "max_entries": self.max_entries,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+_caches: Dict[str, TTLCache] = {}
+
+def get_cache(name: str, ttl: Optional[float] = None, max_entries: Optional[int] = None) -> TTLCache:
+    """
+    Get or create the named cache. CACHE_TTL_<NAME> overrides the TTL; without
+    an explicit `ttl`, CACHE_TTL and then REFERENCE_TTLS give the default.
+    """
+    if name not in _caches:
+        if ttl is None:
+            ttl = os.getenv("CACHE_TTL", REFERENCE_TTLS.get(name, DEFAULT_TTL))
+        _caches[name] = TTLCache(
+            name,
+            ttl=float(os.getenv(f"CACHE_TTL_{name.upper()}", ttl)),
+            max_entries=max_entries or int(os.getenv("CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        )
+    return _caches[name]
+
+def get_cache_stats() -> dict:
+    """Statistics for every cache, keyed by name"""
+    return {name: cache.stats() for name, cache in _caches.items()}
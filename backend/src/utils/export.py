@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, AsyncGenerator, Iterator, Mapping, Sequence
+
+from src.utils.database import async_db_connection
+
+# Rows fetched from the server-side cursor per round trip (and written per chunk)
+EXPORT_BATCH_SIZE = 2000
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
+def _json_default(value: Any):
+    """Serialize the database types json doesn't know about"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # As a string, like the CSV export: a float would round large sums
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _format_ndjson(columns: Sequence[str], rows: list) -> str:
+    return "".join(
+        json.dumps(dict(zip(columns, row)), default=_json_default, separators=(",", ":")) + "\n"
+        for row in rows
+    )
+
+def _format_csv(columns: Sequence[str], rows: list) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(
+        [value.isoformat() if isinstance(value, (datetime, date)) else value for value in row]
+        for row in rows
+    )
+    return buffer.getvalue()
+
+async def stream_query(name: str, sql: str, params: Sequence[Any], columns: Sequence[str],
+                       format: ExportFormat) -> AsyncGenerator[str, None]:
+    """
+    Stream the result of a query as NDJSON or CSV chunks.
+
+    The query runs through a server-side (named) cursor and rows are fetched
+    EXPORT_BATCH_SIZE at a time, so memory stays flat however many rows the
+    table has. The pooled connection is held until the stream is finished.
+
+    Usage:
+        return StreamingResponse(
+            stream_query("rental_export", "SELECT ... FROM rental", (), columns, format),
+            media_type=MEDIA_TYPES[format]
+        )
+    """
+    formatter = _format_csv if format == ExportFormat.CSV else _format_ndjson
+    if format == ExportFormat.CSV:
+        yield _format_csv(columns, [columns])
+    async with async_db_connection() as conn:
+        async with conn.cursor(name=name) as cur:
+            cur.itersize = EXPORT_BATCH_SIZE
+            await cur.execute(sql, params)
+            while True:
+                rows = await cur.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                yield formatter(columns, rows)
+
+def iter_rows(rows: Sequence[Mapping], columns: Sequence[str], format: ExportFormat) -> Iterator[str]:
+    """
+    Stream rows that are already in memory (e.g. a cached report) as NDJSON or
+    CSV, EXPORT_BATCH_SIZE rows per chunk.
+    """
+    formatter = _format_csv if format == ExportFormat.CSV else _format_ndjson
+    if format == ExportFormat.CSV:
+        yield _format_csv(columns, [columns])
+    for start in range(0, len(rows), EXPORT_BATCH_SIZE):
+        yield formatter(columns, [[row[column] for column in columns] for row in rows[start:start + EXPORT_BATCH_SIZE]])
+
+def export_filename(table: str, format: ExportFormat) -> dict:
+    """Content-Disposition header for an export download"""
+    return {"Content-Disposition": f'attachment; filename="{table}.{format.value}"'}
@@ -0,0 +1,97 @@
+from functools import lru_cache
+from typing import Any, Mapping, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException, Request, Response
+from psycopg.rows import dict_row
+from pydantic import BaseModel, create_model
+
+from src.utils.database import async_db_connection
+from src.utils.responses import model_response
+
+def parse_fields(model: Type[BaseModel], value: str) -> Tuple[str, ...]:
+    """
+    Parse a comma-separated `fields` query parameter into field names of
+    `model`, in the model's order. Raises 400 when it is empty or names a
+    field the model does not have.
+    """
+    names = {item.strip() for item in value.split(",") if item.strip()}
+    if not names:
+        raise HTTPException(status_code=400, detail="fields must not be empty")
+    unknown = sorted(names - model.model_fields.keys())
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields for {model.__name__}: {', '.join(unknown)}. "
+                   f"Valid fields: {', '.join(model.model_fields)}"
+        )
+    return tuple(name for name in model.model_fields if name in names)
+
+@lru_cache(maxsize=1024)
+def partial_model(model: Type[BaseModel], names: Tuple[str, ...]) -> Type[BaseModel]:
+    """`model` with only the given fields, keeping their types and defaults"""
+    return create_model(
+        f"{model.__name__}Fields",
+        **{name: (field.annotation, field) for name, field in model.model_fields.items() if name in names}
+    )
+
+class Fields:
+    """
+    Sparse fieldset: the columns a `fields` query parameter selects.
+
+    The fields are checked against the response model, then narrow the
+    SELECT list itself, so columns nobody asked for (film.fulltext,
+    staff.picture) are neither read by Postgres nor moved through Python.
+    `model` is the response model cut down to those fields. Columns the
+    handler needs itself, like the keyset's sort key, are selected with
+    `always` but left out of the body. Without `fields`, every field of
+    the model is selected and `model` is the model itself.
+
+    Usage:
+        selected = Fields(Film, fields, always=keyset.columns)
+        await cur.execute(f"SELECT {selected.columns} FROM film WHERE ...")
+        return list_response(selected.model, await cur.fetchall(), request)
+    """
+
+    def __init__(self, model: Type[BaseModel], fields: Optional[str], always: Sequence[str] = (),
+                 expressions: Optional[Mapping[str, str]] = None):
+        self.partial = fields is not None
+        self.names = parse_fields(model, fields) if self.partial else tuple(model.model_fields)
+        self.model = partial_model(model, self.names) if self.partial else model
+        self.selected = self.names + tuple(name for name in always if name not in self.names)
+        # Columns whose name differs from the field's, e.g. '"zip code" AS zip_code'
+        expressions = dict(expressions or {})
+        self.columns = ", ".join(expressions.get(name, name) for name in self.selected)
+
+    def response(self, request: Request, item: BaseModel) -> Any:
+        """
+        What a by-id handler returns for a full model instance (e.g. a
+        cached one): a response with the instance, or only the selected
+        fields of it, conditional on its last_update.
+        """
+        if self.partial:
+            item = self.model.model_validate({name: getattr(item, name) for name in self.names})
+        return model_response(request, item, getattr(item, "last_update", None))
+
+async def sparse_get(request: Request, model: Type[BaseModel], table: str, key: str, id: int,
+                     fields: str, not_found: str) -> Response:
+    """
+    The row of `table` whose `key` is `id`, with only the given fields
+    selected and returned. Raises 404 with `not_found` when there is no such
+    row. last_update is read (not returned) for the ETag when the model has it.
+
+    Usage, at the top of a by-id handler taking `fields: Optional[str] = None`:
+        if fields is not None:
+            return await sparse_get(request, Film, "film", "film_id", film_id, fields, "Film not found")
+    """
+    validator = ("last_update",) if "last_update" in model.model_fields else ()
+    selected = Fields(model, fields, always=validator)
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(f"SELECT {selected.columns} FROM {table} WHERE {key} = %s", (id,))
+                row = await cur.fetchone()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if not row:
+        raise HTTPException(status_code=404, detail=not_found)
+    return model_response(request, selected.model.model_validate(row), row.get("last_update"))
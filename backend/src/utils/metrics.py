@@ -0,0 +1,197 @@
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Queries slower than this many milliseconds are logged with their SQL (0 logs every query)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+
+# Upper bounds (seconds) of the histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Route label of queries run outside a request (e.g. the report refresh task)
+BACKGROUND = "background"
+
+class Counter:
+    """Prometheus counter, one value per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, dict(zip(self.labels, labels)), value
+
+class Histogram(Counter):
+    """Prometheus histogram with cumulative BUCKETS, one per label set"""
+
+    kind = "histogram"
+
+    def observe(self, labels: tuple, seconds: float):
+        with self._lock:
+            counts = self._values.setdefault(labels, [0] * (len(BUCKETS) + 2))
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    counts[i] += 1
+            counts[-2] += seconds
+            counts[-1] += 1
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = [(labels, list(counts)) for labels, counts in self._values.items()]
+        for labels, counts in items:
+            labels = dict(zip(self.labels, labels))
+            for bound, count in zip(BUCKETS, counts):
+                yield f"{self.name}_bucket", {**labels, "le": repr(bound)}, count
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, counts[-1]
+            yield f"{self.name}_sum", labels, counts[-2]
+            yield f"{self.name}_count", labels, counts[-1]
+
+REQUESTS = Counter("http_requests_total", "Requests served", ("method", "route", "status"))
+REQUEST_DURATION = Histogram("http_request_duration_seconds", "Time to the response headers", ("method", "route"))
+QUERY_DURATION = Histogram("db_query_duration_seconds", "Wall time of each query", ("route", "pool"))
+QUERY_ROWS = Counter("db_query_rows_total", "Rows returned or affected by queries", ("route",))
+SLOW_QUERIES = Counter("db_slow_queries_total", "Queries slower than SLOW_QUERY_MS", ("route",))
+ACQUIRE_DURATION = Histogram("db_pool_acquire_duration_seconds", "Wait for a pooled connection", ("route", "pool"))
+ROUTED = Counter("db_pool_routed_total", "Connections handed out with a read replica configured, by pool and why", ("pool", "reason"))
+SERIALIZATION_DURATION = Histogram("response_serialization_duration_seconds", "Time serializing response bodies", ("route",))
+
+METRICS = [
+    REQUESTS, REQUEST_DURATION, QUERY_DURATION, QUERY_ROWS, SLOW_QUERIES, ACQUIRE_DURATION, ROUTED,
+    SERIALIZATION_DURATION
+]
+
+class RequestTiming:
+    """Database and serialization time spent on one request, for its Server-Timing header"""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.queries = 0
+        self.db = 0.0
+        self.acquire = 0.0
+        self.serialization = 0.0
+
+    @property
+    def route(self) -> str:
+        """Path template of the matched route, e.g. /api/v1/films/{film_id}"""
+        template = getattr(self.scope.get("route"), "path", None)
+        if template is None:
+            return "unmatched"
+        # Routes of an included router may not carry the router's prefix: take
+        # it from the part of the request path in front of the route's own
+        params = self.scope.get("path_params", {})
+        concrete = re.sub(r"{(\w+)(:\w+)?}", lambda m: str(params.get(m.group(1), m.group(0))), template)
+        path = self.scope.get("path", "")
+        return path[:-len(concrete)] + template if concrete and path.endswith(concrete) else template
+
+_request_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+def start_request(scope: dict) -> RequestTiming:
+    """Start collecting timings for the request being handled in this context"""
+    timing = RequestTiming(scope)
+    _request_timing.set(timing)
+    return timing
+
+def _route() -> Tuple[Optional[RequestTiming], str]:
+    timing = _request_timing.get()
+    return timing, (timing.route if timing is not None else BACKGROUND)
+
+def record_query(seconds: float, rows: int, describe: Callable[[], str], pool: str = "primary"):
+    """
+    Record one executed query, logging its SQL (from `describe`, only called
+    then) when it is slower than SLOW_QUERY_MS.
+    """
+    timing, route = _route()
+    if timing is not None:
+        timing.queries += 1
+        timing.db += seconds
+    QUERY_DURATION.observe((route, pool), seconds)
+    if rows > 0:
+        QUERY_ROWS.inc((route,), rows)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc((route,))
+        logger.warning("Slow query (%.1f ms, %d rows) in %s: %s", seconds * 1000, rows, route,
+                       re.sub(r"\s+", " ", describe()).strip())
+
+def record_acquire(seconds: float, pool: str = "primary"):
+    """Record the wait for a connection from the pool"""
+    timing, route = _route()
+    if timing is not None:
+        timing.acquire += seconds
+    ACQUIRE_DURATION.observe((route, pool), seconds)
+
+def record_routing(pool: str, reason: str):
+    """Count a connection handed out by the primary or replica pool, and why it was that one"""
+    ROUTED.inc((pool, reason))
+
+@contextmanager
+def timed_serialization():
+    """Time the serialization of a response body"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        timing, route = _route()
+        if timing is not None:
+            timing.serialization += seconds
+        SERIALIZATION_DURATION.observe((route,), seconds)
+
+def record_request(timing: RequestTiming, method: str, status: int, seconds: float):
+    REQUESTS.inc((method, timing.route, str(status)))
+    REQUEST_DURATION.observe((method, timing.route), seconds)
+
+def server_timing(timing: RequestTiming, seconds: float) -> str:
+    """Server-Timing header value for a request"""
+    return ", ".join([
+        f'db;dur={timing.db * 1000:.2f};desc="{timing.queries} queries"',
+        f"db-acquire;dur={timing.acquire * 1000:.2f}",
+        f"serialize;dur={timing.serialization * 1000:.2f}",
+        f"total;dur={seconds * 1000:.2f}",
+    ])
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+def render_metrics(gauges: Iterable[Tuple[str, str, Dict[str, str], float]] = ()) -> str:
+    """
+    Every metric in the Prometheus text exposition format, plus `gauges`
+    given as (name, help, labels, value).
+    """
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    seen = set()
+    for name, help, labels, value in gauges:
+        if name not in seen:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            seen.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,147 @@
+import base64
+import json
+from collections.abc import Mapping
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, Request, Response
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the sort key values of a row into an opaque cursor token"""
+    payload = []
+    for value in values:
+        if isinstance(value, datetime):
+            payload.append({"dt": value.isoformat()})
+        elif isinstance(value, date):
+            payload.append({"d": value.isoformat()})
+        elif isinstance(value, Decimal):
+            payload.append({"n": str(value)})
+        else:
+            payload.append(value)
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: str, types: Sequence[type]) -> List[Any]:
+    """
+    Decode a cursor token back into sort key values, raising 400 if it is
+    not valid or a value is not of its column's type (an int column also
+    rejects floats and strings, which Postgres would fail to compare or
+    compare as text)
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or len(payload) != len(types):
+            raise ValueError("cursor does not match the sort key")
+        values = []
+        for value in payload:
+            if isinstance(value, dict) and "dt" in value:
+                values.append(datetime.fromisoformat(value["dt"]))
+            elif isinstance(value, dict) and "d" in value:
+                values.append(date.fromisoformat(value["d"]))
+            elif isinstance(value, dict) and "n" in value:
+                values.append(Decimal(value["n"]))
+            elif isinstance(value, (int, float, str)) or value is None:
+                values.append(value)
+            else:
+                raise ValueError("unsupported cursor value")
+        for value, expected in zip(values, types):
+            # Exact types: a bool is not an int, a datetime not a date; ints are valid floats
+            if value is not None and type(value) is not expected and not (expected is float and type(value) is int):
+                raise ValueError("cursor value does not match its column")
+        return values
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+class Keyset:
+    """
+    Keyset (cursor) pagination over a unique sort key.
+
+    Instead of `LIMIT n OFFSET m`, which makes Postgres scan and discard m
+    rows, the next page starts with a row comparison on the sort key, e.g.
+    `(payment_date, payment_id) < (%s, %s)`, so page N costs the same as
+    page 1. The cursors for the next/previous page are returned in a `Link`
+    header. `offset` keeps working when no cursor is given.
+
+    Sort key columns are integer ids unless `types` gives the Python type of
+    each (datetime, Decimal, float, str); cursor values of another type are
+    rejected with a 400.
+
+    Usage:
+        keyset = Keyset(("payment_date", "payment_id"), (datetime, int), descending=True, after=after, before=before)
+        await cur.execute(
+            f"SELECT ... FROM payment WHERE {keyset.condition} ORDER BY {keyset.order_by} LIMIT %s OFFSET %s",
+            (*keyset.params, limit, keyset.offset(offset))
+        )
+        rows = keyset.page(await cur.fetchall())
+        ...
+        keyset.set_link_header(request, response, payments, limit)
+    """
+
+    def __init__(self, columns: Sequence[str], types: Optional[Sequence[type]] = None, descending: bool = False,
+                 after: Optional[str] = None, before: Optional[str] = None):
+        if after and before:
+            raise HTTPException(status_code=400, detail="Use either 'after' or 'before', not both")
+        self.columns = tuple(columns)
+        self.types = tuple(types) if types is not None else (int,) * len(self.columns)
+        if len(self.types) != len(self.columns):
+            raise ValueError("Keyset needs one type per sort key column")
+        self.descending = descending
+        self.after = after
+        self.before = before
+        self.values = decode_cursor(after or before, self.types) if (after or before) else None
+
+    @property
+    def backwards(self) -> bool:
+        """Whether the rows are fetched in reverse order (paging with `before`)"""
+        return self.before is not None
+
+    @property
+    def condition(self) -> str:
+        """SQL condition selecting the rows after/before the cursor (TRUE without a cursor)"""
+        if self.values is None:
+            return "TRUE"
+        operator = "<" if self.descending != self.backwards else ">"
+        placeholders = ", ".join(["%s"] * len(self.columns))
+        return f"({', '.join(self.columns)}) {operator} ({placeholders})"
+
+    @property
+    def params(self) -> List[Any]:
+        """Query parameters for `condition`"""
+        return list(self.values) if self.values is not None else []
+
+    @property
+    def order_by(self) -> str:
+        """SQL ORDER BY list for the sort key"""
+        direction = "DESC" if self.descending != self.backwards else "ASC"
+        return ", ".join(f"{column} {direction}" for column in self.columns)
+
+    def offset(self, offset: int) -> int:
+        """OFFSET to use: cursors replace the offset, without one it is kept as a fallback"""
+        return 0 if self.values is not None else offset
+
+    def page(self, rows: list) -> list:
+        """Put rows fetched backwards (with `before`) back into the sort order"""
+        return rows[::-1] if self.backwards else rows
+
+    def cursor_for(self, item: Any) -> str:
+        """Cursor token for a row, model or mapping carrying the sort key columns"""
+        if isinstance(item, Mapping):
+            return encode_cursor([item[column] for column in self.columns])
+        return encode_cursor([getattr(item, column) for column in self.columns])
+
+    def set_link_header(self, request: Request, response: Response, items: list, limit: int, offset: int = 0):
+        """Set a `Link` header with rel="next"/rel="prev" cursors for the page"""
+        if not items:
+            return
+        base_url = request.url.remove_query_params(["after", "before", "offset"])
+        links = []
+        if self.backwards or len(items) >= limit:
+            next_url = base_url.include_query_params(after=self.cursor_for(items[-1]))
+            links.append(f'<{next_url}>; rel="next"')
+        if self.after or offset or (self.backwards and len(items) >= limit):
+            prev_url = base_url.include_query_params(before=self.cursor_for(items[0]))
+            links.append(f'<{prev_url}>; rel="prev"')
+        if links:
+            response.headers["Link"] = ", ".join(links)
@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+def parse_id_list(value: str, name: str, max_ids: int) -> List[int]:
+    """
+    Parse a comma-separated list of ids from a query parameter, dropping
+    duplicates but keeping their order. Raises 400 when it is malformed,
+    empty or longer than `max_ids`.
+    """
+    try:
+        ids = list(dict.fromkeys(int(item) for item in value.split(",") if item.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be a comma-separated list of integers")
+    if not ids:
+        raise HTTPException(status_code=400, detail=f"{name} must not be empty")
+    if len(ids) > max_ids:
+        raise HTTPException(status_code=400, detail=f"At most {max_ids} {name} per request")
+    return ids
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """A datetime with UTC as its time zone when it has none"""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def date_range(column: str, from_date: Optional[datetime], to_date: Optional[datetime]) -> Tuple[str, List[Any]]:
+    """
+    SQL condition and parameters bounding `column` to [from_date, to_date).
+    Either bound may be missing. The bounds are plain comparisons on the
+    column, so on a table partitioned by it Postgres prunes the partitions
+    outside the range. Bounds without a time zone are taken as UTC, so a
+    naive one and an aware one can be compared.
+    """
+    from_date, to_date = as_utc(from_date), as_utc(to_date)
+    if from_date and to_date and from_date >= to_date:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    conditions, params = ["TRUE"], []
+    if from_date:
+        conditions.append(f"{column} >= %s")
+        params.append(from_date)
+    if to_date:
+        conditions.append(f"{column} < %s")
+        params.append(to_date)
+    return " AND ".join(conditions), params
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Mapping, Optional, Sequence, Type
+
+from fastapi import Request, Response
+from psycopg import AsyncConnection, sql
+from pydantic import BaseModel
+
+from src.utils.database import async_db_connection
+from src.utils.responses import json_response, list_json
+
+logger = logging.getLogger(__name__)
+
+# Materialized views behind the reporting endpoints (data/migrations/002_sales_materialized_views.sql)
+REPORT_VIEWS = ("mv_sales_by_film_category", "mv_sales_by_store")
+
+# Advisory lock taken while refreshing, so only one worker refreshes at a time
+REFRESH_LOCK_ID = 7_310_002
+
+def get_refresh_interval() -> float:
+    """Seconds between background refreshes of the report views (0 disables them)"""
+    return float(os.getenv("REPORT_REFRESH_INTERVAL", 300))
+
+async def refresh_reports() -> Optional[datetime]:
+    """
+    Refresh every report view with REFRESH MATERIALIZED VIEW CONCURRENTLY,
+    so readers keep seeing the previous contents meanwhile, and record the
+    refresh time in report_refresh.
+
+    Returns the refresh time, or None if another worker is already refreshing.
+    """
+    async with async_db_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (REFRESH_LOCK_ID,))
+            if not (await cur.fetchone())[0]:
+                await conn.rollback()
+                return None
+            for view in REPORT_VIEWS:
+                await cur.execute(sql.SQL("REFRESH MATERIALIZED VIEW CONCURRENTLY {}").format(sql.Identifier(view)))
+            await cur.execute(
+                """INSERT INTO report_refresh (view_name, refreshed_at) SELECT unnest(%s::text[]), now()
+                   ON CONFLICT (view_name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at
+                   RETURNING refreshed_at""",
+                (list(REPORT_VIEWS),)
+            )
+            refreshed_at = (await cur.fetchone())[0]
+            await conn.commit()
+            return refreshed_at
+
+async def refresh_reports_periodically(interval: float):
+    """Background task refreshing the report views every `interval` seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_reports()
+        except Exception:
+            logger.exception("Refreshing report views failed")
+
+async def report_refreshed_at(conn: AsyncConnection, view: str) -> Optional[datetime]:
+    """When a report view was last refreshed"""
+    async with conn.cursor() as cur:
+        await cur.execute("SELECT refreshed_at FROM report_refresh WHERE view_name = %s", (view,))
+        row = await cur.fetchone()
+        return row[0] if row else None
+
+async def report_response(conn: AsyncConnection, request: Request, model: Type[BaseModel],
+                          rows: Sequence[Mapping], view: Optional[str]) -> Response:
+    """
+    List response for a page of a report. Pages read from a report view carry
+    its refresh time in X-Refreshed-At and Last-Modified; live pages (view=None)
+    are plain list responses.
+    """
+    refreshed_at = await report_refreshed_at(conn, view) if view else None
+    response = json_response(list_json(model, rows), request, refreshed_at)
+    if refreshed_at is not None:
+        response.headers["X-Refreshed-At"] = refreshed_at.isoformat()
+    return response
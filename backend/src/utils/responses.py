@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Type
+
+from fastapi import Request, Response
+from pydantic import BaseModel, TypeAdapter
+
+from src.utils.metrics import timed_serialization
+
+# Binary body encodings for internal consumers, from the optional msgpack and cbor2 packages
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+# Cache-Control sent with conditional GET responses. "no-cache" lets clients and
+# CDNs store responses but revalidate them (cheaply, with a 304) before reuse.
+CACHE_CONTROL = os.getenv("HTTP_CACHE_CONTROL", "no-cache")
+
+JSON_MEDIA_TYPE = "application/json"
+
+# Media types a client can ask for in Accept instead of JSON, with their encoder
+BINARY_ENCODERS: Dict[str, Callable[[Any], bytes]] = {}
+if msgpack is not None:
+    BINARY_ENCODERS["application/msgpack"] = BINARY_ENCODERS["application/x-msgpack"] = msgpack.packb
+if cbor2 is not None:
+    BINARY_ENCODERS["application/cbor"] = cbor2.dumps
+
+def parse_accept(header: Optional[str]) -> List[Tuple[str, float]]:
+    """
+    Values of an Accept or Accept-Encoding header with their q weights,
+    most preferred first (ties keep the header's order). Values refused
+    with q=0 are kept, with weight 0.
+    """
+    items = []
+    for position, item in enumerate((header or "").split(",")):
+        value, *params = (part.strip() for part in item.split(";"))
+        weight = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(number)
+                except ValueError:
+                    weight = 0.0
+        if value:
+            items.append((position, value.lower(), weight))
+    return [(value, weight) for _, value, weight in sorted(items, key=lambda item: (-item[2], item[0]))]
+
+def response_media_type(request: Optional[Request]) -> str:
+    """
+    The media type to encode a response body in: a binary one from
+    BINARY_ENCODERS when the request's Accept prefers it to JSON,
+    application/json otherwise.
+    """
+    if request is None or not BINARY_ENCODERS:
+        return JSON_MEDIA_TYPE
+    for media_type, weight in parse_accept(request.headers.get("accept")):
+        if weight <= 0:
+            continue
+        if media_type in BINARY_ENCODERS:
+            return media_type
+        if media_type in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+            break
+    return JSON_MEDIA_TYPE
+
+# Bounded: partial models (see src/utils/fields.py) are created per fields= combination
+@lru_cache(maxsize=2048)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+def list_response(model: Type[BaseModel], rows: Sequence[Mapping], request: Optional[Request] = None) -> Response:
+    """
+    Serialize database rows as a JSON list of `model` in a single pass.
+
+    Rows come from a `dict_row` cursor, so no model is built in Python per
+    row: pydantic-core validates the whole list and dumps it straight to
+    JSON bytes. Returning a Response also skips FastAPI's response_model
+    re-validation; keep response_model on the route for the OpenAPI schema.
+    The selected column names must match the model's field names (alias
+    them in SQL where they don't).
+
+    With the request, the response supports conditional GET on the body's
+    hash (see json_response). Pages get no Last-Modified: a row dropping out of
+    a page changes it without moving any last_update forward. A request
+    accepting MessagePack or CBOR (see response_media_type()) gets the same
+    list encoded in it, dumped straight from the validated rows.
+
+    Usage:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute("SELECT film_id, title, ... FROM film")
+            return list_response(Film, await cur.fetchall(), request)
+    """
+    media_type = response_media_type(request)
+    if media_type == JSON_MEDIA_TYPE:
+        return json_response(list_json(model, rows), request)
+    adapter = _list_adapter(model)
+    with timed_serialization():
+        body = BINARY_ENCODERS[media_type](adapter.dump_python(adapter.validate_python(rows), mode="json"))
+    return _body_response(body, media_type, request, None)
+
+def list_json(model: Type[BaseModel], rows: Sequence[Mapping]) -> bytes:
+    """The JSON body list_response() sends, for callers that keep it around (e.g. caches)"""
+    adapter = _list_adapter(model)
+    with timed_serialization():
+        return adapter.dump_json(adapter.validate_python(rows))
+
+def json_response(body: bytes, request: Optional[Request] = None,
+                  last_modified: Optional[datetime] = None) -> Response:
+    """
+    Response for an already serialized JSON body.
+
+    With the request, the body's hash is sent as ETag (plus Last-Modified when
+    known) and a 304 Not Modified without a body is returned when the client's
+    If-None-Match / If-Modified-Since still match. A request accepting
+    MessagePack or CBOR gets the body transcoded to it.
+    """
+    if request is None:
+        return Response(content=body, media_type=JSON_MEDIA_TYPE)
+    media_type = response_media_type(request)
+    if media_type != JSON_MEDIA_TYPE:
+        with timed_serialization():
+            body = BINARY_ENCODERS[media_type](json.loads(body))
+    return _body_response(body, media_type, request, last_modified)
+
+def _body_response(body: bytes, media_type: str, request: Request, last_modified: Optional[datetime]) -> Response:
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    return _conditional(request, etag, last_modified) or Response(
+        content=body, media_type=media_type, headers=_validators(etag, last_modified)
+    )
+
+def model_response(request: Request, item: BaseModel, last_modified: Optional[datetime]) -> Response:
+    """
+    Response for a single row whose version is its `last_update` column.
+
+    The ETag comes from last_update (kept current by the last_updated()
+    trigger), so a matching If-None-Match is answered with a 304 before the
+    model is serialized. Rows without a last_update fall back to a payload hash.
+    Binary encodings (see response_media_type()) get their own ETags.
+    """
+    media_type = response_media_type(request)
+    if last_modified is None:
+        return _body_response(_model_body(item, media_type), media_type, request, None)
+    etag = f"{_timestamp(last_modified).timestamp():.6f}"
+    if media_type != JSON_MEDIA_TYPE:
+        etag += "-" + media_type.rsplit("/", 1)[1]
+    etag = f'"{etag}"'
+    not_modified = _conditional(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    return Response(content=_model_body(item, media_type), media_type=media_type,
+                    headers=_validators(etag, last_modified))
+
+def _model_body(item: BaseModel, media_type: str) -> bytes:
+    with timed_serialization():
+        if media_type == JSON_MEDIA_TYPE:
+            return item.model_dump_json().encode()
+        return BINARY_ENCODERS[media_type](item.model_dump(mode="json"))
+
+def _timestamp(value: datetime) -> datetime:
+    """Aware UTC datetime (naive timestamps are stored in UTC)"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def _validators(etag: str, last_modified: Optional[datetime]) -> dict:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if BINARY_ENCODERS:
+        # The body's encoding depends on Accept
+        headers["Vary"] = "Accept"
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_timestamp(last_modified), usegmt=True)
+    return headers
+
+def _conditional(request: Request, etag: str, last_modified: Optional[datetime]) -> Optional[Response]:
+    """A 304 response if the request's validators match, otherwise None"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        matched = "*" in tags or etag in tags
+    elif last_modified is not None and request.headers.get("if-modified-since"):
+        try:
+            since = _timestamp(parsedate_to_datetime(request.headers["if-modified-since"]))
+        except (TypeError, ValueError):
+            return None
+        matched = _timestamp(last_modified).replace(microsecond=0) <= since
+    else:
+        matched = False
+    return Response(status_code=304, headers=_validators(etag, last_modified)) if matched else None
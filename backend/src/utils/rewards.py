@@ -0,0 +1,76 @@
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from src.utils.analytics import payment_months
+from src.utils.cache import get_cache
+
+REWARD_COLUMNS = [
+    "customer_id", "store_id", "first_name", "last_name", "email", "address_id",
+    "activebool", "create_date", "last_update", "active"
+]
+
+# A month's rewards only change when its payments do, and every payment write
+# invalidates the months it touches, so entries can live for a long time
+rewards_cache = get_cache("rewards", ttl=float(os.getenv("REWARDS_CACHE_TTL", 3600)), max_entries=1024)
+
+def default_rewards_month() -> date:
+    """The month rewards_report() reports on: the one three months back"""
+    today = date.today()
+    month = today.month - 3
+    return date(today.year + (month - 1) // 12, (month - 1) % 12 + 1, 1)
+
+def parse_rewards_month(month: Optional[str]) -> date:
+    """First day of a YYYY-MM month, defaulting to default_rewards_month()"""
+    if month is None:
+        return default_rewards_month()
+    try:
+        return datetime.strptime(month, "%Y-%m").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="month must be formatted as YYYY-MM")
+
+def rewards_query(month: date, min_monthly_purchases: int,
+                  min_dollar_amount_purchased: Decimal) -> Tuple[str, List[Any]]:
+    """
+    SQL and parameters selecting the customers rewards_report() returns, for
+    any month.
+
+    The function builds a temp table and filters on DATE(payment_date), which
+    hides the column from the partition bounds. Here the month is a half-open
+    payment_date range, so only that month's partition is scanned, and the
+    qualifying customers are joined to customer in the same statement.
+    """
+    if min_monthly_purchases <= 0:
+        raise HTTPException(status_code=400, detail="min_monthly_purchases must be > 0")
+    if min_dollar_amount_purchased <= 0:
+        raise HTTPException(status_code=400, detail="min_dollar_amount_purchased must be > 0.00")
+    sql = f"""SELECT {", ".join(f"c.{column}" for column in REWARD_COLUMNS)}
+              FROM customer c
+              JOIN (
+                  SELECT customer_id
+                  FROM payment
+                  WHERE payment_date >= %s::date AND payment_date < %s::date + interval '1 month'
+                  GROUP BY customer_id
+                  HAVING sum(amount) > %s AND count(*) > %s
+              ) rewarded ON rewarded.customer_id = c.customer_id
+              ORDER BY c.customer_id"""
+    return sql, [month, month, min_dollar_amount_purchased, min_monthly_purchases]
+
+def rewards_key(month: date, min_monthly_purchases: int, min_dollar_amount_purchased: Decimal) -> tuple:
+    return (month, min_monthly_purchases, min_dollar_amount_purchased.normalize())
+
+def invalidate_rewards(payment_dates: Optional[Iterable[datetime]] = None):
+    """
+    Drop the cached rewards of the months the given payments fall in, or of
+    every month when the affected months aren't known (e.g. a payment moved
+    to another date).
+    """
+    if payment_dates is None:
+        rewards_cache.invalidate()
+        return
+    months = payment_months(payment_dates)
+    if months:
+        rewards_cache.invalidate_matching(lambda key: key[0] in months)
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from src.utils.params import as_utc, date_range
+
+
+def test_date_range_both_bounds():
+    start = datetime(2017, 2, 1, tzinfo=timezone.utc)
+    end = datetime(2017, 3, 1, tzinfo=timezone.utc)
+    condition, params = date_range("payment_date", start, end)
+    assert condition == "TRUE AND payment_date >= %s AND payment_date < %s"
+    assert params == [start, end]
+
+
+def test_date_range_single_bound():
+    start = datetime(2017, 2, 1, tzinfo=timezone.utc)
+    assert date_range("payment_date", start, None) == ("TRUE AND payment_date >= %s", [start])
+    assert date_range("payment_date", None, start) == ("TRUE AND payment_date < %s", [start])
+
+
+def test_date_range_without_bounds():
+    assert date_range("payment_date", None, None) == ("TRUE", [])
+
+
+def test_date_range_naive_bound_is_utc():
+    _, params = date_range("payment_date", datetime(2017, 2, 1), None)
+    assert params == [datetime(2017, 2, 1, tzinfo=timezone.utc)]
+    assert params[0].tzinfo is timezone.utc
+
+
+def test_date_range_naive_and_aware_bounds():
+    # 2017-02-01 00:00 UTC is after 2017-01-31 22:00 at -01:00
+    end = datetime(2017, 1, 31, 22, tzinfo=timezone(timedelta(hours=-1)))
+    with pytest.raises(HTTPException) as error:
+        date_range("payment_date", datetime(2017, 2, 1), end)
+    assert error.value.status_code == 400
+    _, params = date_range("payment_date", datetime(2017, 1, 31, 22), end)
+    assert params == [datetime(2017, 1, 31, 22, tzinfo=timezone.utc), end]
+
+
+@pytest.mark.parametrize("start, end", [
+    (datetime(2017, 3, 1, tzinfo=timezone.utc), datetime(2017, 2, 1, tzinfo=timezone.utc)),
+    (datetime(2017, 2, 1, tzinfo=timezone.utc), datetime(2017, 2, 1, tzinfo=timezone.utc)),
+])
+def test_date_range_rejects_empty_range(start, end):
+    with pytest.raises(HTTPException) as error:
+        date_range("payment_date", start, end)
+    assert error.value.status_code == 400
+
+
+def test_as_utc_keeps_aware_values():
+    aware = datetime(2017, 2, 1, tzinfo=timezone(timedelta(hours=3)))
+    assert as_utc(aware) is aware
+    assert as_utc(None) is None
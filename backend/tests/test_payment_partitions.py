@@ -0,0 +1,76 @@
+"""
+Partition pruning of the payment queries bounded with date_range().
+
+Needs the sample database: set DATABASE_URL to run these tests. The payment
+partitions of the sample data start at 21:00 UTC, e.g. payment_p2017_02
+holds [2017-01-31 21:00, 2017-02-28 21:00) UTC.
+"""
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from src.utils.pagination import Keyset
+from src.utils.params import date_range
+
+psycopg = pytest.importorskip("psycopg")
+
+pytestmark = pytest.mark.skipif(not os.getenv("DATABASE_URL"), reason="DATABASE_URL is not set")
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.fixture(scope="module")
+def conn():
+    with psycopg.connect(os.environ["DATABASE_URL"]) as conn:
+        # Not UTC, so a naive bound left to the server would shift the range
+        conn.execute("SET TimeZone = 'America/New_York'")
+        yield conn
+
+
+def scanned_partitions(conn, sql: str, params) -> set:
+    """Names of the payment partitions in the plan of the query"""
+    plan = conn.execute(f"EXPLAIN (FORMAT JSON) {sql}", params).fetchone()[0]
+    found, nodes = set(), [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node.get("Relation Name", "").startswith("payment_p"):
+            found.add(node["Relation Name"])
+        nodes.extend(node.get("Plans", []))
+    return found
+
+
+def list_query(from_date, to_date):
+    """The query of GET /payments?from=&to="""
+    keyset = Keyset(("payment_date", "payment_id"), (datetime, int), descending=True)
+    period, params = date_range("payment_date", from_date, to_date)
+    return (f"SELECT payment_id, payment_date FROM payment WHERE {period} AND {keyset.condition} "
+            f"ORDER BY {keyset.order_by} LIMIT %s OFFSET %s", [*params, *keyset.params, 100, 0])
+
+
+def export_query(from_date, to_date):
+    """The query of GET /payments/export?from=&to="""
+    period, params = date_range("payment_date", from_date, to_date)
+    return f"SELECT payment_id FROM payment WHERE {period} ORDER BY payment_date, payment_id", params
+
+
+RANGES = [
+    (utc(2017, 1, 31, 21), utc(2017, 2, 28, 21), {"payment_p2017_02"}),
+    (utc(2017, 2, 15), utc(2017, 4, 10), {"payment_p2017_02", "payment_p2017_03", "payment_p2017_04"}),
+    (utc(2017, 5, 31, 21), None, {"payment_p2017_06"}),
+    (None, utc(2017, 1, 31, 21), {"payment_p2017_01"}),
+    # Naive bounds are UTC: at the session's -05:00 the end would reach into March
+    (datetime(2017, 2, 1), datetime(2017, 2, 28, 20), {"payment_p2017_02"}),
+]
+
+
+@pytest.mark.parametrize("query", [list_query, export_query])
+@pytest.mark.parametrize("from_date, to_date, expected", RANGES)
+def test_only_overlapping_partitions_are_scanned(conn, query, from_date, to_date, expected):
+    assert scanned_partitions(conn, *query(from_date, to_date)) == expected
+
+
+def test_unbounded_query_scans_every_partition(conn):
+    assert len(scanned_partitions(conn, *export_query(None, None))) == 6
@@ -0,0 +1,187 @@
+"""
+execute_pipelined() over a high-latency link.
+
+Connects through a local TCP proxy that delays every packet by half of
+RTT_MS each way, like a Postgres in another region: sent one after the
+other, each statement (and a BEGIN and a COMMIT) costs a round trip, while a
+pipelined batch should cost about one.
+
+Needs the sample database: set DATABASE_URL to run these tests.
+"""
+import asyncio
+import os
+import time
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+pytest_asyncio = pytest.importorskip("pytest_asyncio")
+
+from psycopg import pq
+from psycopg.conninfo import conninfo_to_dict, make_conninfo
+from psycopg.rows import dict_row
+
+from src.utils.database import execute_pipelined
+
+pytestmark = [
+    pytest.mark.skipif(not os.getenv("DATABASE_URL"), reason="DATABASE_URL is not set"),
+    pytest.mark.asyncio,
+]
+
+# Round trip the proxy adds, large enough to dwarf the local query times
+RTT_MS = 40.0
+
+CUSTOMER_ID = 5
+
+# The four reads behind GET /api/v1/customers/{id}/profile
+PROFILE = [
+    ("""SELECT c.customer_id, c.first_name, c.last_name, a.address, ci.city, co.country FROM customer c
+        JOIN address a ON a.address_id = c.address_id JOIN city ci ON ci.city_id = a.city_id
+        JOIN country co ON co.country_id = ci.country_id WHERE c.customer_id = %s""", (CUSTOMER_ID,)),
+    ("""SELECT rental_id, rental_date, return_date FROM rental WHERE customer_id = %s
+        ORDER BY rental_date DESC, rental_id DESC LIMIT 20""", (CUSTOMER_ID,)),
+    ("""SELECT payment_id, amount, payment_date FROM payment WHERE customer_id = %s
+        ORDER BY payment_date DESC, payment_id DESC LIMIT 20""", (CUSTOMER_ID,)),
+    ("SELECT COALESCE(SUM(amount), 0) AS total FROM payment WHERE customer_id = %s", (CUSTOMER_ID,)),
+]
+
+INCREMENT = ("UPDATE pipeline_hits SET hits = hits + 1 WHERE id = %s", (1,))
+
+
+class LatencyProxy:
+    """TCP proxy to Postgres delaying everything it forwards by half the round trip time each way"""
+
+    def __init__(self, conninfo: str, rtt_ms: float):
+        self.target = conninfo_to_dict(conninfo)
+        self.delay = rtt_ms / 2000
+        self.connections: set = set()
+
+    async def start(self) -> int:
+        """Start listening on a free local port and return it"""
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """Stop listening and wait for the proxied connections to wind down"""
+        self.server.close()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+
+    async def _open_upstream(self):
+        host, port = self.target.get("host") or "localhost", int(self.target.get("port") or 5432)
+        if host.startswith("/"):
+            return await asyncio.open_unix_connection(f"{host}/.s.PGSQL.{port}")
+        return await asyncio.open_connection(host, port)
+
+    async def _handle(self, reader, writer):
+        self.connections.add(asyncio.current_task())
+        upstream_reader, upstream_writer = await self._open_upstream()
+        await asyncio.gather(self._forward(reader, upstream_writer), self._forward(upstream_reader, writer),
+                             return_exceptions=True)
+
+    async def _forward(self, reader, writer):
+        # Chunks are delivered in order, each `delay` after it arrived
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def deliver():
+            while True:
+                due, data = await queue.get()
+                if data is None:
+                    break
+                await asyncio.sleep(max(0.0, due - loop.time()))
+                writer.write(data)
+                await writer.drain()
+            writer.close()
+
+        delivery = asyncio.create_task(deliver())
+        try:
+            while data := await reader.read(65536):
+                queue.put_nowait((loop.time() + self.delay, data))
+        finally:
+            queue.put_nowait((0.0, None))
+            await delivery
+
+
+@pytest_asyncio.fixture
+async def conn():
+    """A connection as the pool hands them out (autocommit off, no transaction open), behind the proxy"""
+    url = os.environ["DATABASE_URL"]
+    proxy = LatencyProxy(url, RTT_MS)
+    port = await proxy.start()
+    async with await psycopg.AsyncConnection.connect(make_conninfo(url, host="127.0.0.1", port=port)) as conn:
+        await conn.execute("CREATE TEMP TABLE pipeline_hits (id integer PRIMARY KEY, hits integer NOT NULL)")
+        await conn.execute("INSERT INTO pipeline_hits VALUES (1, 0)")
+        await conn.commit()
+        yield conn
+    await proxy.close()
+
+
+async def round_trips(coro) -> tuple:
+    """The result of awaiting `coro` and the round trips it took"""
+    start = time.perf_counter()
+    result = await coro
+    return result, (time.perf_counter() - start) * 1000 / RTT_MS
+
+
+async def sequential(conn, queries):
+    results = []
+    async with conn.cursor(row_factory=dict_row) as cur:
+        for query, params in queries:
+            await cur.execute(query, params)
+            results.append(await cur.fetchall() if cur.description else [])
+    await conn.commit()
+    return results
+
+
+async def hits(conn) -> int:
+    async with conn.cursor() as cur:
+        await cur.execute("SELECT hits FROM pipeline_hits WHERE id = 1")
+        (value,) = await cur.fetchone()
+    await conn.commit()
+    return value
+
+
+async def test_batch_costs_one_round_trip(conn):
+    expected, sequential_trips = await round_trips(sequential(conn, PROFILE))
+    results, pipelined_trips = await round_trips(execute_pipelined(conn, PROFILE))
+    assert [result.rows for result in results] == expected
+    assert sequential_trips >= len(PROFILE)
+    assert pipelined_trips < 1.5
+
+
+async def test_write_commits_in_one_round_trip(conn):
+    (result,), trips = await round_trips(execute_pipelined(conn, [INCREMENT]))
+    assert result.rowcount == 1
+    assert trips < 1.5
+    assert conn.info.transaction_status == pq.TransactionStatus.IDLE
+    assert await hits(conn) == 1
+
+
+async def test_failing_statement_rolls_back_the_batch(conn):
+    with pytest.raises(psycopg.errors.DivisionByZero):
+        await execute_pipelined(conn, [INCREMENT, ("SELECT 1 / 0", None), INCREMENT])
+    assert conn.info.transaction_status == pq.TransactionStatus.IDLE
+    assert await hits(conn) == 0
+
+
+@pytest.mark.parametrize("fail", [False, True])
+async def test_autocommit_is_restored(conn, fail):
+    queries = [INCREMENT, ("SELECT 1 / 0", None)] if fail else [INCREMENT]
+    try:
+        await execute_pipelined(conn, queries)
+    except psycopg.errors.DivisionByZero:
+        pass
+    assert conn.autocommit is False
+    # The next statements open a transaction again, which the caller commits
+    await conn.execute(*INCREMENT)
+    assert conn.info.transaction_status == pq.TransactionStatus.INTRANS
+    await conn.rollback()
+
+
+async def test_batch_joins_an_open_transaction(conn):
+    await conn.execute("SELECT 1")
+    await execute_pipelined(conn, [INCREMENT])
+    assert conn.autocommit is False
+    assert conn.info.transaction_status == pq.TransactionStatus.INTRANS
+    await conn.rollback()
+    assert await hits(conn) == 0